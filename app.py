@@ -1,354 +1,962 @@
-import json, os
-from flask import Flask, jsonify, send_from_directory, request  # type: ignore
+import json, mimetypes, os, re
+from flask import Flask, Response, abort, g, jsonify, send_file, request  # type: ignore
 from flask_cors import CORS # type: ignore
 from pathlib import Path
-from threading import Lock
+from threading import Event, Lock, Thread
+from concurrent.futures import ThreadPoolExecutor, wait
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+import argparse
+import array
+import atexit
+import base64
+import bisect
+import contextvars
+import functools
+import gzip
+import hashlib
+import logging
+import math
+import queue
+import random
+import socket
+import sqlite3
+import stat
+import sys
+import tempfile
+import threading
+import uuid
+import zlib
+from types import MappingProxyType
+from macro_catalog import load_macro_catalog
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process profile locking
+    fcntl = None
 profile_lock = Lock()
 # Lock for thread-safe profile access
 import requests # type: ignore
+from requests.adapters import HTTPAdapter # type: ignore
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError # type: ignore
+import time
 import urllib.parse
 
-app = Flask(__name__, static_folder='dist', static_url_path='')
+# dist/ is served by the indexed static handler below, not Flask's static route
+app = Flask(__name__, static_folder=None)
 CORS(app)
 app.url_map.strict_slashes = False
 
+# Logging: records are handed to a queue and written (as JSON lines) by a
+# listener thread, so request threads never wait on stdout/journald. Each route
+# can have its own minimum level and sample rate; the static, metrics and debug
+# routes only log warnings by default. Every request gets an id (X-Request-ID, taken from the
+# client if sent) that is attached to its records and forwarded to the devices.
+LOG_LEVEL = os.environ.get("MACROLINK_LOG_LEVEL", "INFO").upper()
+LOG_RING_SIZE = int(os.environ.get("MACROLINK_LOG_RING", 500))
 
-PROFILE_PATH = os.path.join(os.path.dirname(__file__), 'profiles.json')
 
-# macroData.js = source of truth for macros
-# Update app.py from macroData.js whenever new macros are added
+LOG_CONFIG_ERRORS = []  # (variable, entry) pairs skipped while parsing, warned about once logging is up
 
-STATIC_MACROS = {
-    "Reinforce": "Reinforce",
-    "Resupply": "Resupply"
-}
 
-DYNAMIC_MACROS = {
-    # Orbital Strikes
-    "Orbital_Precision_Strike": "Orbital Precision Strike",
-    "Orbital_Gatling_Barrage": "Orbital Gatling Barrage",
-    "Orbital_Airburst_Strike": "Orbital Airburst Strike",
-    "Orbital_Napalm_Barrage": "Orbital Napalm Barrage",
-    "Orbital_120MM_HE_Barrage": "Orbital 120MM HE Barrage",
-    "Orbital_Walking_Barrage": "Orbital Walking Barrage",
-    "Orbital_380MM_HE_Barrage": "Orbital 380MM HE Barrage",
-    "Orbital_Railcannon_Strike": "Orbital Railcannon Strike",
-    "Orbital_Laser": "Orbital Laser",
-    "Orbital_EMS_Strike": "Orbital EMS Strike",
-    "Orbital_Gas_Strike": "Orbital Gas Strike",
-    "Orbital_Smoke_Strike": "Orbital Smoke Strike",
-    # Eagle Strikes
-    "Eagle_500KG_Bomb": "Eagle 500KG Bomb",
-    "Eagle_Strafing_Run": "Eagle Strafing Run",
-    "Eagle_110MM_Rocket_Pods": "Eagle 110MM Rocket Pods",
-    "Eagle_Airstrike": "Eagle Airstrike",
-    "Eagle_Cluster_Bomb": "Eagle Cluster Bomb",
-    "Eagle_Napalm_Airstrike": "Eagle Napalm Airstrike",
-    "Eagle_Smoke_Strike": "Eagle Smoke Strike",
-    # Support Weapons
-    "CQC-1_One_True_Flag": "CQC-1 One True Flag",
-    "MG-43_Machine_Gun": "MG-43 Machine Gun",
-    "M-105_Stalwart": "M-105 Stalwart",
-    "MG-206_Heavy_Machine_Gun": "MG-206 Heavy Machine Gun",
-    "RS-422_Railgun": "RS-422 Railgun",
-    "APW-1_Anti-Materiel_Rifle": "APW-1 Anti-Materiel Rifle",
-    "GL-21_Grenade_Launcher": "GL-21 Grenade Launcher",
-    "GL-52_De-Escalator": "GL-52 De-Escalator",
-    "TX-14_Sterilizer": "TX-14 Sterilizer",
-    "FLAM-40_Flamethrower": "FLAM-40 Flamethrower",
-    "LAS-98_Laser_Cannon": "LAS-98 Laser Cannon",
-    "LAS-99_Quasar_Cannon": "LAS-99 Quasar Cannon",
-    "PLAS-45_Epoch": "PLAS-45 Epoch",
-    "ARC-3_Arc_Thrower": "ARC-3 Arc Thrower",
-    "MLS-4X_Commando": "MLS-4X Commando",
-    "S-11_Speargun": "S-11 Speargun",
-    "EAT-17_Expendable_Anti-Tank": "EAT-17 Expendable Anti-Tank",
-    "EAT-700_Expendable_Napalm": "EAT-700 Expendable Napalm",
-    "AC-8_Autocannon": "AC-8 Autocannon",
-    "RL-77_Airburst_Rocket_Launcher": "RL-77 Airburst Rocket Launcher",
-    "FAF-14_Spear_Launcher": "FAF-14 Spear Launcher",
-    "StA-X3_W.A.S.P._Launcher": "StA-X3 W.A.S.P. Launcher",
-    "GR-8_Recoilless_Rifle": "GR-8 Recoilless Rifle",
-    "MS-11_Solo_Silo": "MS-11 Solo Silo",
-    # Support Equipment
-    "LIFT-860_Hover_Pack": "LIFT-860 Hover Pack",
-    "LIFT-850_Jump_Pack": "LIFT-850 Jump Pack",
-    "LIFT-182_Warp_Pack": "LIFT-182 Warp Pack",
-    "SH-32_Shield_Generator_Pack": "SH-32 Shield Generator Pack",
-    "SH-51_Directional_Shield_Backpack": "SH-51 Directional Shield Backpack",
-    "SH-20_Ballistic_Shield_Backpack": "SH-20 Ballistic Shield Backpack",
-    "B-1_Supply_Pack": "B-1 Supply Pack",
-    "B-100_Portable_Hellbomb": "B-100 Portable Hellbomb",
-    "AX-AR-23_Guard_Dog": "AX/AR-23 'Guard Dog'",
-    "AX-LAS-5_Guard_Dog_Rover": "AX/LAS-5 'Guard Dog' Rover",
-    "AX-TX-13_Guard_Dog_Dog_Breath": "AX/TX-13 'Guard Dog' Dog Breath",
-    "AX_ARC-3_Guard_Dog_K9": "AX/ARC-3 'Guard Dog' K9",
-    "M-102_Fast_Recon_Vehicle": "M-102 Fast Recon Vehicle",
-    "EXO-49_Emancipator_Exosuit": "EXO-49 Emancipator Exosuit",
-    "EXO-45_Patriot_Exosuit": "EXO-45 Patriot Exosuit",
-    # Sentries and Emplacements
-    "A-G-16_Gatling_Sentry": "A/G-16 Gatling Sentry",
-    "A-MG-43_Machine_Gun_Sentry": "A/MG-43 Machine Gun Sentry",
-    "E-FLAM-40_Flame_Sentry": "E/FLAM-40 Flame Sentry",
-    "A-MLS-4X_Rocket_Sentry": "A/MLS-4X Rocket Sentry",
-    "A-LAS-98_Laser_Sentry": "A/LAS-98 Laser Sentry",
-    "A-AC-8_Autocannon_Sentry": "A/AC-8 Autocannon Sentry",
-    "A-M-23_EMS_Mortar_Sentry": "A/M-23 EMS Mortar Sentry",
-    "A-M-12_Mortar_Sentry": "A/M-12 Mortar Sentry",
-    "FX-12_Shield_Generator_Relay": "FX-12 Shield Generator Relay",
-    "E-GL-21_Grenadier_Battlement": "E/GL-21 Grenadier Battlement",
-    "E-AT-12_Anti-Tank_Emplacement": "E/AT-12 Anti-Tank Emplacement",
-    "E-MG-101_HMG_Emplacement": "E/MG-101 HMG Emplacement",
-    "A-ARC-3_Tesla_Tower": "A/ARC-3 Tesla Tower",
-    "MD-17_Anti-Tank_Mines": "MD-17 Anti-Tank Mines",
-    "MD-8_Gas_Mines": "MD-8 Gas Mines",
-    "MD-6_Anti-Personnel_Minefield": "MD-6 Anti-Personnel Minefield",
-    "MD-14_Incendiary_Mines": "MD-14 Incendiary Mines",
-    # General Actions
-    "SOS_Beacon": "SOS Beacon",
-    "NUX-223_Hellbomb": "NUX-223 Hellbomb",
-    "SSSD_Delivery": "SSSD Delivery",
-    "Seismic_Probe": "Seismic Probe",
-    "Upload_Data": "Upload Data",
-    "Eagle_Rearm": "Eagle Rearm",
-    "Hive_Breaker_Drill": "Hive Breaker Drill",
-    "Prospecting_Drill": "Prospecting Drill",
-    "Super_Earth_Flag": "Super Earth Flag",
-    "SEAF_Artillery": "SEAF Artillery"
-}
+def parse_route_settings(name, convert):
+    # MACROLINK_LOG_ROUTES="catch_all=WARNING,trigger_macro=DEBUG" -> {"catch_all": convert("WARNING"), ...}
+    settings = {}
+    for item in os.environ.get(name, "").split(','):
+        if item.strip():
+            route, _, setting = item.partition('=')
+            try:
+                settings[route.strip()] = convert(setting.strip())
+            except ValueError:
+                LOG_CONFIG_ERRORS.append((name, item.strip()))
+    return settings
 
-MACRO_IMAGES = {
-    # Orbital Strikes
-    "Orbital_Precision_Strike": "Orbital_Precision_Strike.png",
-    "Orbital_Gatling_Barrage": "Orbital_Gatling_Barrage.png",
-    "Orbital_Airburst_Strike": "Orbital_Airburst_Strike.png",
-    "Orbital_Napalm_Barrage": "Orbital_Napalm_Barrage.png",
-    "Orbital_120MM_HE_Barrage": "Orbital_120MM_HE_Barrage.png",
-    "Orbital_Walking_Barrage": "Orbital_Walking_Barrage.png",
-    "Orbital_380MM_HE_Barrage": "Orbital_380MM_HE_Barrage.png",
-    "Orbital_Railcannon_Strike": "Orbital_Railcannon_Strike.png",
-    "Orbital_Laser": "Orbital_Laser.png",
-    "Orbital_EMS_Strike": "Orbital_EMS_Strike.png",
-    "Orbital_Gas_Strike": "Orbital_Gas_Strike.png",
-    "Orbital_Smoke_Strike": "Orbital_Smoke_Strike.png",
-    # Eagle Strikes
-    "Eagle_500KG_Bomb": "Eagle_500KG_Bomb.png",
-    "Eagle_Strafing_Run": "Eagle_Strafing_Run.png",
-    "Eagle_110MM_Rocket_Pods": "Eagle_110MM_Rocket_Pods.png",
-    "Eagle_Airstrike": "Eagle_Airstrike.png",
-    "Eagle_Cluster_Bomb": "Eagle_Cluster_Bomb.png",
-    "Eagle_Napalm_Airstrike": "Eagle_Napalm_Airstrike.png",
-    "Eagle_Smoke_Strike": "Eagle_Smoke_Strike.png",
-    # Support Weapons
-    "CQC-1_One_True_Flag": "CQC-1_One_True_Flag.png",
-    "MG-43_Machine_Gun": "MG-43_Machine_Gun.png",
-    "M-105_Stalwart": "M-105_Stalwart.png",
-    "MG-206_Heavy_Machine_Gun": "MG-206_Heavy_Machine_Gun.png",
-    "RS-422_Railgun": "RS-422_Railgun.png",
-    "APW-1_Anti-Materiel_Rifle": "APW-1_Anti-Materiel_Rifle.png",
-    "GL-21_Grenade_Launcher": "GL-21_Grenade_Launcher.png",
-    "TX-14_Sterilizer": "TX-14_Sterilizer.png",
-    "FLAM-40_Flamethrower": "FLAM-40_Flamethrower.png",
-    "LAS-98_Laser_Cannon": "LAS-98_Laser_Cannon.png",
-    "LAS-99_Quasar_Cannon": "LAS-99_Quasar_Cannon.png",
-    "ARC-3_Arc_Thrower": "ARC-3_Arc_Thrower.png",
-    "MLS-4X_Commando": "MLS-4X_Commando.png",
-    "EAT-17_Expendable_Anti-Tank": "EAT-17_Expendable_Anti-Tank.png",
-    "AC-8_Autocannon": "AC-8_Autocannon.png",
-    "RL-77_Airburst_Rocket_Launcher": "RL-77_Airburst_Rocket_Launcher.png",
-    "FAF-14_Spear_Launcher": "FAF-14_Spear_Launcher.png",
-    "StA-X3_W.A.S.P._Launcher": "StA-X3_W.A.S.P._Launcher.png",
-    "GR-8_Recoilless_Rifle": "GR-8_Recoilless_Rifle.png",
-    "GL-52_De-Escalator": "GL-52_De-Escalator.png",
-    # Support Equipment
-    "SH-32_Shield_Generator_Pack": "SH-32_Shield_Generator_Pack.png",
-    "SH-51_Directional_Shield_Backpack": "SH-51_Directional_Shield_Backpack.png",
-    "SH-20_Ballistic_Shield_Backpack": "SH-20_Ballistic_Shield_Backpack.png",
-    "LIFT-860_Hover_Pack": "LIFT-860_Hover_Pack.png",
-    "B-1_Supply_Pack": "B-1_Supply_Pack.png",
-    "B-100_Portable_Hellbomb": "B-100_Portable_Hellbomb.png",
-    "LIFT-850_Jump_Pack": "LIFT-850_Jump_Pack.png",
-    "AX-AR-23_Guard_Dog": "AX_AR-23_Guard_Dog.png",
-    "AX-LAS-5_Guard_Dog_Rover": "AX_LAS-5_Guard_Dog_Rover.png",
-    "AX-TX-13_Guard_Dog_Dog_Breath": "AX_TX-13_Guard_Dog_Dog_Breath.png",
-    "M-102_Fast_Recon_Vehicle": "M-102_Fast_Recon_Vehicle.png",
-    "EXO-49_Emancipator_Exosuit": "EXO-49_Emancipator_Exosuit.png",
-    "EXO-45_Patriot_Exosuit": "EXO-45_Patriot_Exosuit.png",
-    "AX_ARC-3_Guard_Dog_K9": "AX_ARC-3_Guard_Dog_K9.png",
-    # Sentries and Emplacements
-    "A-G-16_Gatling_Sentry": "A_G-16_Gatling_Sentry.png",
-    "A-MG-43_Machine_Gun_Sentry": "A_MG-43_Machine_Gun_Sentry.png",
-    "E-FLAM-40_Flame_Sentry": "E_FLAM-40_Flame_Sentry.png",
-    "A-MLS-4X_Rocket_Sentry": "A_MLS-4X_Rocket_Sentry.png",
-    "A-AC-8_Autocannon_Sentry": "A_AC-8_Autocannon_Sentry.png",
-    "A-M-23_EMS_Mortar_Sentry": "A_M-23_EMS_Mortar_Sentry.png",
-    "A-M-12_Mortar_Sentry": "A_M-12_Mortar_Sentry.png",
-    "FX-12_Shield_Generator_Relay": "FX-12_Shield_Generator_Relay.png",
-    "E-GL-21_Grenadier_Battlement": "E_GL-21_Grenadier_Battlement.png",
-    "E-AT-12_Anti-Tank_Emplacement": "E_AT-12_Anti-Tank_Emplacement.png",
-    "E-MG-101_HMG_Emplacement": "E_MG-101_HMG_Emplacement.png",
-    "A-ARC-3_Tesla_Tower": "A_ARC-3_Tesla_Tower.png",
-    "MD-17_Anti-Tank_Mines": "MD-17_Anti-Tank_Mines.png",
-    "MD-8_Gas_Mines": "MD-8_Gas_Mines.png",
-    "MD-6_Anti-Personnel_Minefield": "MD-6_Anti-Personnel_Minefield.png",
-    "MD-14_Incendiary_Mines": "MD-14_Incendiary_Mines.png",
-    "NUX-223_Hellbomb": "NUX-223_Hellbomb.png",
-    # General Actions
-    "SSSD_Delivery": "SSSD_Delivery.png",
-    "Seismic_Probe": "Seismic_Probe.png",
-    "Upload_Data": "Upload_Data.png",
-    "Eagle_Rearm": "Eagle_Rearm.png",
-    "Reinforce": "redeploy.png",
-    "Resupply": "resupply.png",
-    "SOS_Beacon": "sos.png",
-    "Hive_Breaker_Drill": "Hive_Breaker_Drill.png",
-    "Prospecting_Drill": "Prospecting_Drill.png",
-    "Super_Earth_Flag": "Super_Earth_Flag.png",
-    "SEAF_Artillery": "SEAF_Artillery.png",
-    # Control Group
-    "PLAS-45_Epoch": "Epoch.png",
-    "LIFT-182_Warp_Pack": "Warp_Pack.png",
-    "A-LAS-98_Laser_Sentry": "Laser_Sentry.png",
-    # Dust Devils
-    "S-11_Speargun": "Speargun.png",
-    "EAT-700_Expendable_Napalm": "Expendable_Napalm.png",
-    "MS-11_Solo_Silo": "Solo_Silo.png"
-}
 
-MACRO_STYLES = {
-    "Orbital_Precision_Strike": {"border": "red"},
-    "Orbital_Gatling_Barrage": {"border": "red"},
-    "Orbital_Airburst_Strike": {"border": "red"},
-    "Orbital_Napalm_Barrage": {"border": "red"},
-    "Orbital_120MM_HE_Barrage": {"border": "red"},
-    "Orbital_Walking_Barrage": {"border": "red"},
-    "Orbital_380MM_HE_Barrage": {"border": "red"},
-    "Orbital_Railcannon_Strike": {"border": "red"},
-    "Orbital_Laser": {"border": "red"},
-    "Orbital_EMS_Strike": {"border": "red"},
-    "Orbital_Gas_Strike": {"border": "red"},
-    "Orbital_Smoke_Strike": {"border": "red"},
-    "Eagle_500KG_Bomb": {"border": "red"},
-    "Eagle_Strafing_Run": {"border": "red"},
-    "Eagle_110MM_Rocket_Pods": {"border": "red"},
-    "Eagle_Airstrike": {"border": "red"},
-    "Eagle_Cluster_Bomb": {"border": "red"},
-    "Eagle_Napalm_Airstrike": {"border": "red"},
-    "Eagle_Smoke_Strike": {"border": "red"},
-    "CQC-1_One_True_Flag": {"border": "blue"},
-    "MG-43_Machine_Gun": {"border": "blue"},
-    "M-105_Stalwart": {"border": "blue"},
-    "MG-206_Heavy_Machine_Gun": {"border": "blue"},
-    "RS-422_Railgun": {"border": "blue"},
-    "APW-1_Anti-Materiel_Rifle": {"border": "blue"},
-    "GL-21_Grenade_Launcher": {"border": "blue"},
-    "TX-14_Sterilizer": {"border": "blue"},
-    "FLAM-40_Flamethrower": {"border": "blue"},
-    "LAS-98_Laser_Cannon": {"border": "blue"},
-    "LAS-99_Quasar_Cannon": {"border": "blue"},
-    "ARC-3_Arc_Thrower": {"border": "blue"},
-    "MLS-4X_Commando": {"border": "blue"},
-    "EAT-17_Expendable_Anti-Tank": {"border": "blue"},
-    "AC-8_Autocannon": {"border": "blue"},
-    "RL-77_Airburst_Rocket_Launcher": {"border": "blue"},
-    "FAF-14_Spear_Launcher": {"border": "blue"},
-    "StA-X3_W.A.S.P._Launcher": {"border": "blue"},
-    "GR-8_Recoilless_Rifle": {"border": "blue"},
-    "SH-32_Shield_Generator_Pack": {"border": "blue"},
-    "SH-51_Directional_Shield_Backpack": {"border": "blue"},
-    "SH-20_Ballistic_Shield_Backpack": {"border": "blue"},
-    "LIFT-860_Hover_Pack": {"border": "blue"},
-    "B-1_Supply_Pack": {"border": "blue"},
-    "B-100_Portable_Hellbomb": {"border": "blue"},
-    "LIFT-850_Jump_Pack": {"border": "blue"},
-    "AX-AR-23_Guard_Dog": {"border": "blue"},
-    "AX-LAS-5_Guard_Dog_Rover": {"border": "blue"},
-    "AX-TX-13_Guard_Dog_Dog_Breath": {"border": "blue"},
-    "M-102_Fast_Recon_Vehicle": {"border": "blue"},
-    "EXO-49_Emancipator_Exosuit": {"border": "blue"},
-    "EXO-45_Patriot_Exosuit": {"border": "blue"},
-    "A-G-16_Gatling_Sentry": {"border": "green"},
-    "A-MG-43_Machine_Gun_Sentry": {"border": "green"},
-    "E-FLAM-40_Flame_Sentry": {"border": "green"},
-    "A-MLS-4X_Rocket_Sentry": {"border": "green"},
-    "A-AC-8_Autocannon_Sentry": {"border": "green"},
-    "A-M-23_EMS_Mortar_Sentry": {"border": "green"},
-    "A-M-12_Mortar_Sentry": {"border": "green"},
-    "FX-12_Shield_Generator_Relay": {"border": "green"},
-    "E-GL-21_Grenadier_Battlement": {"border": "green"},
-    "E-AT-12_Anti-Tank_Emplacement": {"border": "green"},
-    "E-MG-101_HMG_Emplacement": {"border": "green"},
-    "A-ARC-3_Tesla_Tower": {"border": "green"},
-    "MD-17_Anti-Tank_Mines": {"border": "green"},
-    "MD-8_Gas_Mines": {"border": "green"},
-    "MD-6_Anti-Personnel_Minefield": {"border": "green"},
-    "MD-14_Incendiary_Mines": {"border": "green"},
-    "Reinforce": {"border": "yellow"},
-    "SOS_Beacon": {"border": "yellow"},
-    "Resupply": {"border": "yellow"},
-    "NUX-223_Hellbomb": {"border": "yellow"},
-    "SSSD_Delivery": {"border": "yellow"},
-    "Seismic_Probe": {"border": "yellow"},
-    "Upload_Data": {"border": "yellow"},
-    "Eagle_Rearm": {"border": "yellow"},
-    "SEAF_Artillery": {"border": "yellow"},
-    "GL-52_De-Escalator": {"border": "blue"},
-    "AX_ARC-3_Guard_Dog_K9": {"border": "blue"},
-    "Hive_Breaker_Drill": {"border": "yellow"},
-    "Prospecting_Drill": {"border": "yellow"},
-    "Super_Earth_Flag": {"border": "yellow"},
-    # Control Group
-    "PLAS-45_Epoch": {"border": "blue"},
-    "LIFT-182_Warp_Pack": {"border": "blue"},
-    "A-LAS-98_Laser_Sentry": {"border": "green"},
-    # Dust Devils
-    "S-11_Speargun": {"border": "blue"},
-    "EAT-700_Expendable_Napalm": {"border": "blue"},
-    "MS-11_Solo_Silo": {"border": "blue"}
-}
+def parse_log_level(value):
+    # "warning" or "30" -> 30; getLevelName() returns a "Level x" string for unknown names
+    level = int(value) if value.isdigit() else logging.getLevelName(value.upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level {value!r}")
+    return level
 
-# Normalized macro names (lowercase key → readable value)
-NORMALIZED_MACROS = {k.lower(): v for k, v in {**DYNAMIC_MACROS, **STATIC_MACROS}.items()}
 
-def load_profiles():
-    if not os.path.exists(PROFILE_PATH):
-        return {}
-    with open(PROFILE_PATH, 'r') as f:
-        return json.load(f)
-    
+def parse_sample_rate(value):
+    rate = float(value)
+    if not 0 <= rate <= 1:
+        raise ValueError(f"Sample rate {value!r} is not between 0 and 1")
+    return rate
 
-def load_user_profiles(user):
-    try:
-        with open("profiles.json", "r") as f:
-            data = json.load(f)
-            return data.get(user, {})  # returns a dict of profiles
-    except Exception as e:
-        print("Failed to load profiles.json:", e)
-        return {}
 
+QUIET_ROUTES = ("catch_all", "index", "dashboard_view", "settings_view", "manifest", "metrics", "debug_logs")
+ROUTE_LOG_LEVELS = {route: logging.WARNING for route in QUIET_ROUTES}
+ROUTE_LOG_LEVELS.update(parse_route_settings("MACROLINK_LOG_ROUTES", parse_log_level))
+ROUTE_LOG_SAMPLING = parse_route_settings("MACROLINK_LOG_SAMPLE", parse_sample_rate)
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+route_var = contextvars.ContextVar("route", default=None)
+
+LOG_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+def log_event(record):
+    event = {"ts": round(record.created, 3), "level": record.levelname, "msg": record.getMessage()}
+    event.update((key, value) for key, value in vars(record).items()
+                 if key not in LOG_RECORD_ATTRS and value is not None)
+    return event
+
+
+class RouteFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        record.route = route = route_var.get()
+        if route is None:
+            return True
+        if record.levelno < ROUTE_LOG_LEVELS.get(route, logging.NOTSET):
+            return False
+        rate = ROUTE_LOG_SAMPLING.get(route)
+        return rate is None or record.levelno >= logging.WARNING or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(log_event(record), ensure_ascii=False, default=str)
+
+
+class RingHandler(logging.Handler):
+    # Most recent records for /debug/logs
+    def __init__(self, size=LOG_RING_SIZE):
+        super().__init__()
+        self.records = deque(maxlen=size)
+
+    def emit(self, record):
+        self.records.append(log_event(record))
+
+
+log_queue = queue.SimpleQueue()
+log_ring = RingHandler()
+log_stream = logging.StreamHandler(sys.stdout)
+log_stream.setFormatter(JsonFormatter())
+# The listener thread is started by the first record each process logs: a
+# pre-fork server (gunicorn) imports this module once, and a thread started at
+# import would not survive into the workers.
+log_listener = None
+log_listener_pid = None
+log_listener_lock = Lock()
+
+
+def start_log_listener():
+    global log_listener, log_listener_pid
+    with log_listener_lock:
+        if log_listener_pid == os.getpid():
+            return
+        log_listener = QueueListener(log_queue, log_stream, log_ring)
+        log_listener.start()
+        log_listener_pid = os.getpid()
+        atexit.register(log_listener.stop)
+
+
+def reset_log_listener():
+    # In a forked child: the parent's listener thread and lock state did not come along
+    global log_listener, log_listener_pid, log_listener_lock
+    log_listener, log_listener_pid, log_listener_lock = None, None, Lock()
+    while True:  # records still queued at the fork are the parent's to write
+        try:
+            log_queue.get_nowait()
+        except queue.Empty:
+            break
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_log_listener)
+
+
+class ListenerQueueHandler(QueueHandler):
+    def emit(self, record):
+        if log_listener_pid != os.getpid():
+            start_log_listener()
+        super().emit(record)
+
+
+log = logging.getLogger("macrolink")
+log.setLevel(LOG_LEVEL)
+log.addFilter(RouteFilter())
+log.addHandler(ListenerQueueHandler(log_queue))
+log.propagate = False
+
+# Werkzeug's own access log is replaced by the per-route one below
+werkzeug_log = logging.getLogger("werkzeug")
+werkzeug_log.setLevel(logging.DEBUG if LOG_LEVEL == "DEBUG" else logging.WARNING)
+werkzeug_log.addHandler(ListenerQueueHandler(log_queue))
+werkzeug_log.propagate = False
+
+for name, entry in LOG_CONFIG_ERRORS:
+    log.warning("Ignoring invalid %s entry %r", name, entry, extra={"setting": name})
+
+
+@app.before_request
+def start_request_log():
+    g.request_started = time.perf_counter()
+    g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:12]
+    request_id_var.set(g.request_id)
+    route_var.set(request.endpoint)
+
+
+@app.after_request
+def finish_request_log(response):
+    response.headers["X-Request-ID"] = g.get("request_id", "")
+    started = g.get("request_started")
+    log.info("%s %s %s", request.method, request.path, response.status_code,
+             extra={"status": response.status_code,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2) if started else None})
+    return response
+
+
+@app.teardown_request
+def clear_request_log(exc=None):
+    request_id_var.set(None)
+    route_var.set(None)
+
+
+PROFILE_PATH = os.environ.get("MACROLINK_PROFILE_PATH", os.path.join(os.path.dirname(__file__), 'profiles.json'))
+PROFILE_DB_PATH = os.environ.get("MACROLINK_PROFILE_DB", os.path.join(os.path.dirname(__file__), 'profiles.db'))
+PROFILE_BACKEND = os.environ.get("MACROLINK_PROFILE_BACKEND", "json")
+# "process" adds a file lock so several worker processes can share profiles.json
+PROFILE_LOCKING = os.environ.get("MACROLINK_PROFILE_LOCKING", "process" if fcntl else "thread")
+
+# The macro catalog (see macro_catalog.py) is compiled once at startup; the
+# backend refuses to start without one.
+MACRO_CATALOG = load_macro_catalog()
+
+# Case-insensitive lookup: lowercase alias -> canonical key
+MACRO_ALIASES = MappingProxyType({info.alias: key for key, info in MACRO_CATALOG.items()})
+
+
+def resolve_macro(name):
+    return MACRO_ALIASES.get(name.lower())
+
+
+def unknown_macros(macros):
+    # Entries of a profile's macro list that are not in the catalog
+    return [m for m in macros if not isinstance(m, str) or resolve_macro(m) is None]
+
+# Instrumentation: lock-protected counters and fixed-bucket histograms,
+# rendered in Prometheus text format on /metrics.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+metrics_registry = []
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = Lock()
+        metrics_registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        lines += [f"{self.name}{format_labels(self.labels, key)} {value}" for key, value in values]
+        return lines
 
-def save_profiles(data):
-    with open(PROFILE_PATH, 'w') as f:
-        json.dump(data, f, indent=2)
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = Lock()
+        metrics_registry.append(self)
+
+    def observe(self, value, *label_values):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[idx] += 1
+            entry[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = [(key, list(entry)) for key, entry in self._values.items()]
+        for key, entry in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {entry[-1]}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+trigger_latency = Histogram("macrolink_trigger_duration_seconds",
+                            "Trigger round trip to the device", ("user", "device", "macro"))
+upstream_errors = Counter("macrolink_upstream_errors_total",
+                          "Failed device requests by kind (timeout, connection, http, other)",
+                          ("device", "endpoint", "kind"))
+status_poll_latency = Histogram("macrolink_status_poll_duration_seconds",
+                                "Status request duration per device", ("device",))
+status_cycle_latency = Histogram("macrolink_status_cycle_duration_seconds",
+                                 "Duration of a full status poll across all devices")
+profile_store_latency = Histogram("macrolink_profile_store_duration_seconds",
+                                  "Profile store operation duration", ("kind", "op"))
+
+
+def requests_error_kind(e):
+    if isinstance(e, requests.exceptions.Timeout):
+        return "timeout"
+    if isinstance(e, requests.exceptions.ConnectionError):
+        return "connection"
+    if isinstance(e, requests.exceptions.HTTPError):
+        return "http"
+    return "other"
+
+
+def device_name(base_url):
+    return device_registry.name_for(base_url)
+
+
+def record_trigger(user, base_url, macro, seconds, error_kind=None):
+    device = device_name(base_url)
+    trigger_latency.observe(seconds, user, device, macro)
+    if error_kind:
+        upstream_errors.inc(device, "trigger", error_kind)
+    events.publish("trigger", {"user": user, "device": device, "macro": macro,
+                               "status": "error" if error_kind else "success",
+                               "error": error_kind, "elapsed_ms": round(seconds * 1000, 1)})
+
+
+def record_status_poll(pico_id, seconds, error_kind=None):
+    status_poll_latency.observe(seconds, pico_id)
+    if error_kind:
+        upstream_errors.inc(pico_id, "status", error_kind)
+
+
+def timed_profile_op(kind):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile_store_latency.observe(time.perf_counter() - start, kind, fn.__name__)
+        return wrapper
+    return decorator
+
+
+class ProfileFileLock:
+    # profile_lock plus an flock on a sidecar file, so the read-modify-write of
+    # profiles.json is also exclusive across worker processes. Readers take
+    # shared(): other workers' readers go ahead, only a writer waits for them.
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._pid = None
+
+    def _lock_fd(self):
+        # A descriptor inherited through fork() shares its flock with the parent: reopen per process
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    def __enter__(self):
+        profile_lock.acquire()
+        try:
+            fcntl.flock(self._lock_fd(), fcntl.LOCK_EX)
+        except BaseException:
+            profile_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            profile_lock.release()
+
+    @contextmanager
+    def shared(self):
+        profile_lock.acquire()  # threads of one process still share one in-memory copy
+        try:
+            fcntl.flock(self._lock_fd(), fcntl.LOCK_SH)
+            try:
+                yield self
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            profile_lock.release()
+
+    # The lock file also holds a write generation, bumped under the flock after
+    # every rewrite of profiles.json. Unlike the file's stat it never repeats.
+    GENERATION_WIDTH = 20
+
+    def generation(self):
+        data = os.pread(self._lock_fd(), self.GENERATION_WIDTH, 0)
+        return int(data) if data.strip() else 0
+
+    def bump(self):
+        # Only while holding the lock
+        generation = self.generation() + 1
+        os.pwrite(self._lock_fd(), b"%0*d" % (self.GENERATION_WIDTH, generation), 0)
+        return generation
+
+
+# In-memory copy of profiles.json, guarded by profile_lock (and a file lock in
+# "process" mode). The file is only re-parsed when its stamp changes. In
+# "process" mode the stamp includes the write generation kept in the lock file,
+# which is how other workers' writes are noticed: replaced files can reuse an
+# inode within one mtime tick, so stat alone may miss them. The stat part still
+# catches a hand edit.
+class JsonProfileStore:
+    def __init__(self, path, locking=PROFILE_LOCKING):
+        self.path = path
+        self._data = {}
+        self._index = {}  # user -> {lowercase profile name: stored name}
+        self._stamp = None
+        self._loaded = False
+        self._version = 0  # bumped whenever the cached data changes
+        self._sorted = {}  # user -> (version, sorted lowercase names) for paging
+        self._file_lock = ProfileFileLock(path + '.lock') if locking == "process" and fcntl else None
+        self._lock = self._file_lock or profile_lock
+
+    def lock(self, user=None, shared=False):
+        # Every write rewrites the whole file, so all users share one lock; reads
+        # (shared=True) only exclude writers, not other workers' readers
+        if shared and self._file_lock:
+            return self._file_lock.shared()
+        return self._lock
+
+    def _file_stamp(self, generation=None):
+        if generation is None:
+            generation = self._file_lock.generation() if self._file_lock else 0
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (generation, st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _refresh(self):
+        stamp = self._file_stamp()
+        if self._loaded and stamp == self._stamp:
+            return
+        data = {}
+        if stamp is not None:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        self._data = data
+        self._index = {user: {name.lower(): name for name in profiles} for user, profiles in data.items()}
+        self._stamp = stamp
+        self._loaded = True
+        self._version += 1
+
+    def _write(self):
+        # Temp file + fsync + rename: readers in any process see the old or the new file, never a partial one
+        self._version += 1
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(self.path)}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                os.chmod(tmp_path, stat.S_IMODE(os.stat(self.path).st_mode))
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, self.path)
+        except Exception:
+            self._loaded = False  # memory may be ahead of disk; re-read next time
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        if hasattr(os, 'O_DIRECTORY'):
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)  # make the rename itself durable
+            finally:
+                os.close(dir_fd)
+        self._stamp = self._file_stamp(self._file_lock.bump() if self._file_lock else 0)
+
+    @property
+    def version(self):
+        self._refresh()
+        return self._version
+
+    @timed_profile_op("read")
+    def all(self):
+        self._refresh()
+        return self._data
+
+    @timed_profile_op("read")
+    def names(self, user):
+        self._refresh()
+        return list(self._data.get(user, {}).keys())
+
+    @timed_profile_op("read")
+    def get(self, user, name):
+        self._refresh()
+        stored = self._index.get(user, {}).get(name.lower())
+        if stored is None:
+            return None
+        return self._data[user][stored]
+
+    @timed_profile_op("read")
+    def exists(self, user, name):
+        self._refresh()
+        return name.lower() in self._index.get(user, {})
+
+    @timed_profile_op("read")
+    def page(self, user, after=None, limit=None):
+        # (name, macros) ordered by lowercase name, starting after the `after` key
+        self._refresh()
+        cached = self._sorted.get(user)
+        if cached is None or cached[0] != self._version:
+            cached = self._sorted[user] = (self._version, sorted(self._index.get(user, {})))
+        keys = cached[1]
+        start = bisect.bisect_right(keys, after) if after is not None else 0
+        keys = keys[start:start + limit] if limit else keys[start:]
+        index, profiles = self._index.get(user, {}), self._data.get(user, {})
+        return [(index[key], profiles[index[key]]) for key in keys]
+
+    def export(self, user=None):
+        # Generator of (user, name, macros). Only references are copied up front; the
+        # macro lists are never mutated in place, so they stay valid while streaming.
+        with self.lock(shared=True):
+            self._refresh()
+            users = [user] if user is not None else list(self._data)
+            snapshot = [(u, list(self._data.get(u, {}).items())) for u in users]
+        for u, items in snapshot:
+            for name, macros in items:
+                yield u, name, macros
+
+    def _put(self, user, name, macros):
+        index = self._index.setdefault(user, {})
+        profiles = self._data.setdefault(user, {})
+        stored = index.get(name.lower(), name)
+        profiles[stored] = macros
+        index[name.lower()] = stored
+
+    @timed_profile_op("write")
+    def save(self, user, name, macros):
+        self._refresh()
+        self._put(user, name, macros)
+        self._write()
+
+    @timed_profile_op("write")
+    def save_many(self, entries):
+        # One file rewrite for the whole batch of (user, name, macros)
+        self._refresh()
+        count = 0
+        for user, name, macros in entries:
+            self._put(user, name, macros)
+            count += 1
+        if count:
+            self._write()
+        return count
+
+    @timed_profile_op("write")
+    def delete(self, user, name):
+        self._refresh()
+        stored = self._index.get(user, {}).pop(name.lower(), None)
+        if stored is None:
+            return False
+        del self._data[user][stored]
+        self._write()
+        return True
+
+    @timed_profile_op("write")
+    def rename(self, user, old_name, new_name):
+        self._refresh()
+        index = self._index.get(user, {})
+        stored = index.pop(old_name.lower())
+        # Keeps the profile's position, as the SQLite backend does
+        self._data[user] = {new_name if name == stored else name: macros
+                            for name, macros in self._data[user].items()}
+        index[new_name.lower()] = new_name
+        self._write()
+
+
+# SQLite (WAL) backend: one row per (user, profile) holding the ordered macro
+# list as JSON. A write touches only its own rows, but every write transaction
+# (BEGIN IMMEDIATE, plus the shared profile_meta counter) holds SQLite's one
+# database-wide write lock. Writers of all users and processes take turns on
+# it; the per-user locks only order a user's read-modify-write sequences.
+# Reads never wait for it.
+PROFILE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    user TEXT NOT NULL,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    macros TEXT NOT NULL,
+    PRIMARY KEY (user, name_key)
+);
+CREATE TABLE IF NOT EXISTS profile_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO profile_meta (id, version) VALUES (0, 0);
+"""
+
+
+class SqliteProfileStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._user_locks = {}
+        self._locks_lock = Lock()
+        conn = self._conn()
+        conn.executescript(PROFILE_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            # Shared change counter, so every connection (and process) sees writes
+            conn.execute("UPDATE profile_meta SET version = version + 1")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @property
+    def version(self):
+        return self._conn().execute("SELECT version FROM profile_meta").fetchone()[0]
+
+    @contextmanager
+    def lock(self, user=None, shared=False):
+        if user is None or shared:
+            yield  # reads run against a consistent WAL snapshot
+            return
+        with self._locks_lock:
+            user_lock = self._user_locks.setdefault(user, Lock())
+        with user_lock:
+            yield
+
+    @timed_profile_op("read")
+    def all(self):
+        data = {}
+        rows = self._conn().execute("SELECT user, name, macros FROM profiles ORDER BY user, position")
+        for user, name, macros in rows:
+            data.setdefault(user, {})[name] = json.loads(macros)
+        return data
+
+    @timed_profile_op("read")
+    def names(self, user):
+        rows = self._conn().execute("SELECT name FROM profiles WHERE user = ? ORDER BY position", (user,))
+        return [name for (name,) in rows]
+
+    @timed_profile_op("read")
+    def get(self, user, name):
+        row = self._conn().execute("SELECT macros FROM profiles WHERE user = ? AND name_key = ?",
+                                   (user, name.lower())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @timed_profile_op("read")
+    def exists(self, user, name):
+        return self._conn().execute("SELECT 1 FROM profiles WHERE user = ? AND name_key = ?",
+                                    (user, name.lower())).fetchone() is not None
+
+    @timed_profile_op("read")
+    def page(self, user, after=None, limit=None):
+        # Keyset paging on the (user, name_key) primary key
+        rows = self._conn().execute(
+            "SELECT name, macros FROM profiles WHERE user = ? AND name_key > ? ORDER BY name_key LIMIT ?",
+            (user, after if after is not None else "", limit or -1))
+        return [(name, json.loads(macros)) for name, macros in rows]
+
+    def export(self, user=None):
+        # Own connection: a single SELECT reads one WAL snapshot for as long as the stream runs
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        try:
+            if user is None:
+                rows = conn.execute("SELECT user, name, macros FROM profiles ORDER BY user, position")
+            else:
+                rows = conn.execute("SELECT user, name, macros FROM profiles WHERE user = ? ORDER BY position", (user,))
+            while True:
+                batch = rows.fetchmany(256)
+                if not batch:
+                    break
+                for u, name, macros in batch:
+                    yield u, name, json.loads(macros)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _put(conn, user, name, macros):
+        updated = conn.execute("UPDATE profiles SET macros = ? WHERE user = ? AND name_key = ?",
+                               (json.dumps(macros), user, name.lower())).rowcount
+        if not updated:
+            conn.execute(
+                "INSERT INTO profiles (user, name, name_key, position, macros) "
+                "SELECT ?, ?, ?, COALESCE(MAX(position), -1) + 1, ? FROM profiles WHERE user = ?",
+                (user, name, name.lower(), json.dumps(macros), user))
+
+    @timed_profile_op("write")
+    def save(self, user, name, macros):
+        with self._transaction() as conn:
+            self._put(conn, user, name, macros)
+
+    @timed_profile_op("write")
+    def save_many(self, entries):
+        count = 0
+        with self._transaction() as conn:
+            for user, name, macros in entries:
+                self._put(conn, user, name, macros)
+                count += 1
+        return count
+
+    @timed_profile_op("write")
+    def delete(self, user, name):
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM profiles WHERE user = ? AND name_key = ?",
+                                (user, name.lower())).rowcount > 0
+
+    @timed_profile_op("write")
+    def rename(self, user, old_name, new_name):
+        with self._transaction() as conn:
+            conn.execute("UPDATE profiles SET name = ?, name_key = ? WHERE user = ? AND name_key = ?",
+                         (new_name, new_name.lower(), user, old_name.lower()))
+
+
+def migrate_profiles(json_path=PROFILE_PATH, db_path=PROFILE_DB_PATH):
+    # One-shot import of profiles.json into the SQLite backend; existing rows are overwritten.
+    # Returns (count, collisions): names in the file that normalize to one already migrated
+    # for the same user are skipped and listed as (user, name, kept name), not overwritten
+    with open(json_path, 'r') as f:
+        data = json.load(f)
+    store = SqliteProfileStore(db_path)
+    count, collisions = 0, []
+    with store._transaction() as conn:
+        for user, profiles in data.items():
+            kept = {}
+            for name, macros in profiles.items():
+                key = normalize_name(name)
+                if key in kept:
+                    collisions.append((user, name, kept[key]))
+                    continue
+                kept[key] = name
+                conn.execute("INSERT OR REPLACE INTO profiles (user, name, name_key, position, macros) "
+                             "VALUES (?, ?, ?, ?, ?)",
+                             (user, name, key, len(kept) - 1, json.dumps(macros)))
+                count += 1
+    return count, collisions
+
+
+def create_profile_store(backend=PROFILE_BACKEND):
+    if backend == "sqlite":
+        return SqliteProfileStore(PROFILE_DB_PATH)
+    if backend != "json":
+        raise ValueError(f"Unknown profile backend: {backend}")
+    return JsonProfileStore(PROFILE_PATH)
+
+
+profile_store = create_profile_store()
 
 def normalize_name(name):
     return name.strip().lower()
 
+# Conditional GET and compression for the JSON APIs. ETags carry a per-process
+# id and a version/hash so a restarted server never matches a stale client copy.
+INSTANCE_ID = uuid.uuid4().hex[:8]
+JSON_COMPRESS_MIN_SIZE = 512
+
+
+def json_etag(body, version=None):
+    digest = hashlib.sha1(body).hexdigest()[:16]
+    return f"{version}-{digest}" if version is not None else digest
+
+
+def conditional_json(payload=None, body=None, etag=None, weak=False):
+    if body is None:
+        body = app.json.dumps(payload).encode()
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag or json_etag(body), weak=weak)
+    response.headers['Cache-Control'] = 'no-cache'  # always revalidate, 304 when unchanged
+    return response.make_conditional(request)
+
+
+@app.after_request
+def compress_json(response):
+    if (response.mimetype != 'application/json' or response.status_code != 200
+            or response.is_streamed or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < JSON_COMPRESS_MIN_SIZE:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(['gzip', 'deflate'])
+    if encoding == 'gzip':
+        response.set_data(gzip.compress(body, compresslevel=5))
+    elif encoding == 'deflate':
+        response.set_data(zlib.compress(body, 5))
+    else:
+        return response
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)  # encoded bytes differ from the identity representation
+    return response
+
+# Static serving for the Vite bundle. dist/ is indexed once and re-scanned when
+# a rebuild changes it; precompressed .br/.gz siblings are served when the client
+# accepts them, and hashed assets/ files are cached as immutable.
+DIST_DIR = os.path.join(os.path.dirname(__file__), 'dist')
+STATIC_RELOAD_INTERVAL = 2
+STATIC_DEFAULT_MAX_AGE = 3600
+STATIC_IMMUTABLE_MAX_AGE = 31536000
+STATIC_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+HASHED_ASSET = re.compile(r"^assets/.+-[\w-]{8,}\.\w+$")
+
+mimetypes.add_type('image/webp', '.webp')
+mimetypes.add_type('font/woff2', '.woff2')
+mimetypes.add_type('audio/mpeg', '.mp3')
+mimetypes.add_type('audio/wav', '.wav')
+
+StaticFile = namedtuple("StaticFile", "path mimetype etag mtime variants cache_control")
+
+
+class StaticIndex:
+    def __init__(self, root):
+        self.root = root
+        self._files = {}
+        self._dirs = [root]  # every directory the last scan walked
+        self._stamp = None
+        self._checked_at = 0
+        self._lock = Lock()
+
+    def _dir_stamp(self):
+        # Adding or removing a file (a new build's assets, precompressed variants) changes
+        # the mtime of its directory, so every indexed directory is part of the stamp
+        try:
+            index_mtime = os.stat(os.path.join(self.root, 'index.html')).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        stamp = [index_mtime]
+        for path in self._dirs:
+            try:
+                stamp.append(os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _scan(self):
+        files, self._dirs = {}, []
+        for dirpath, _, filenames in os.walk(self.root):
+            self._dirs.append(dirpath)
+            names = set(filenames)
+            for filename in filenames:
+                if filename.endswith(('.br', '.gz')) and filename.rsplit('.', 1)[0] in names:
+                    continue
+                path = os.path.join(dirpath, filename)
+                relpath = os.path.relpath(path, self.root).replace(os.sep, '/')
+                st = os.stat(path)
+                variants = {encoding: path + suffix for encoding, suffix in STATIC_ENCODINGS
+                            if filename + suffix in names}
+                if relpath == 'index.html':
+                    cache_control = 'no-cache'
+                elif HASHED_ASSET.match(relpath):
+                    cache_control = f'public, max-age={STATIC_IMMUTABLE_MAX_AGE}, immutable'
+                else:
+                    cache_control = f'public, max-age={STATIC_DEFAULT_MAX_AGE}'
+                files[relpath] = StaticFile(path, mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                                            f"{st.st_mtime_ns:x}-{st.st_size:x}", st.st_mtime, variants,
+                                            cache_control)
+        return files
+
+    def lookup(self, relpath):
+        now = time.monotonic()
+        if now - self._checked_at > STATIC_RELOAD_INTERVAL:
+            with self._lock:
+                if now - self._checked_at > STATIC_RELOAD_INTERVAL:
+                    stamp = self._dir_stamp()
+                    if stamp != self._stamp:
+                        self._files = self._scan() if stamp else {}
+                        # Taken before the scan, so nothing added during it is missed; a scan
+                        # that found new directories just leads to one more scan next time
+                        self._stamp = stamp
+                    self._checked_at = now
+        return self._files.get(relpath)
+
+
+static_index = StaticIndex(DIST_DIR)
+
+
+def serve_static(entry, mimetype=None):
+    encoding = None
+    # Byte ranges (audio seeking) are only served from the identity file
+    if entry.variants and 'Range' not in request.headers:
+        encoding = request.accept_encodings.best_match(list(entry.variants))
+    path = entry.variants[encoding] if encoding else entry.path
+    response = send_file(path, mimetype=mimetype or entry.mimetype, conditional=True,
+                         etag=f"{entry.etag}-{encoding}" if encoding else entry.etag,
+                         last_modified=entry.mtime, max_age=None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if entry.variants:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = entry.cache_control
+    return response
+
+
+def serve_index():
+    entry = static_index.lookup('index.html')
+    if entry is None:
+        abort(404)
+    return serve_static(entry)
+
+
 @app.route('/static/manifest.json')
 def manifest():
-    return send_from_directory(app.static_folder, 'manifest.json', mimetype='application/manifest+json')
+    entry = static_index.lookup('manifest.json')
+    if entry is None:
+        abort(404)
+    return serve_static(entry, mimetype='application/manifest+json')
 
 @app.route('/')
 def index():
-    return send_from_directory('dist', 'index.html')
+    return serve_index()
 
 @app.route('/dashboard')
 def dashboard_view():
-    return send_from_directory('dist', 'index.html')
+    return serve_index()
 
 @app.route('/settings')
 def settings_view():
-    return send_from_directory('dist', 'index.html')
+    return serve_index()
 
 # Old server-side dashboard route (deprecated)
 # @app.route("/dashboard")
@@ -370,40 +978,1532 @@ PICO_IPS = {
     "blue": "http://192.168.50.35:8888"
 }
 
+# Which device each user's triggers go to
+USER_DEVICES = {
+    "user1": "green",
+    "user2": "blue"
+}
+
+
+def parse_device_list(value):
+    # "green=http://10.0.0.5:8888,blue=http://10.0.0.6:8888" -> {"green": ..., "blue": ...}
+    devices = {}
+    for item in value.split(','):
+        if item.strip():
+            name, _, url = item.partition('=')
+            devices[name.strip()] = url.strip().rstrip('/')
+    return devices
+
+
+# Point the backend at other devices (e.g. tools/fake_pico.py) without editing code.
+# An explicit MACROLINK_DEVICES also wins over the devices listed in devices.json.
+ENV_DEVICES = parse_device_list(os.environ["MACROLINK_DEVICES"]) if os.environ.get("MACROLINK_DEVICES") else None
+if ENV_DEVICES is not None:
+    PICO_IPS = ENV_DEVICES
+
+# Device registry: PICO_IPS/USER_DEVICES are only the defaults. A devices.json
+# of the form {"devices": {"red": "http://10.0.0.7:8888"}, "users": {"user3": "red"}}
+# replaces them (its "devices" only if MACROLINK_DEVICES is unset) and is picked
+# up again whenever it changes, and Picos that
+# broadcast {"name": "red", "port": 8888} on the discovery port are added on the
+# fly. Lookups on the trigger path read prebuilt dicts; rebuilds swap them whole.
+DEVICE_CONFIG_PATH = os.environ.get("MACROLINK_DEVICE_CONFIG", os.path.join(os.path.dirname(__file__), 'devices.json'))
+DEVICE_RELOAD_INTERVAL = 2
+DISCOVERY_PORT = int(os.environ.get("MACROLINK_DISCOVERY_PORT", 0))  # 0 disables discovery
+DISCOVERY_TTL = float(os.environ.get("MACROLINK_DISCOVERY_TTL", 60))
+
+
+class DeviceRegistry:
+    def __init__(self, path, devices, users, discovery_port=DISCOVERY_PORT, discovery_ttl=DISCOVERY_TTL,
+                 override=None):
+        self.path = path
+        self.override = override  # device list that takes precedence over the file's
+        self.default_devices = dict(devices)
+        self.default_users = dict(users)
+        self.discovery_port = discovery_port
+        self.discovery_ttl = discovery_ttl
+        self.devices = MappingProxyType({})  # name -> base_url
+        self.version = 0
+        self._targets = {}  # user or device name -> base_url
+        self._names = {}  # base_url -> name
+        self._users = {}  # device name -> user key its profiles and triggers use
+        self._configured = (self.default_devices, self.default_users)
+        self._discovered = {}  # name -> (base_url, last seen monotonic)
+        self._removed_hooks = []  # called with each base_url a rebuild drops
+        self._stamp = None
+        self._checked_at = 0
+        self._started = False
+        self._lock = Lock()
+        self._rebuild()
+        self._load()
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self):
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        devices, users = self.default_devices, self.default_users
+        if stamp is not None:
+            try:
+                with open(self.path, 'r') as f:
+                    config = json.load(f)
+                devices = {name: url.rstrip('/') for name, url in config.get("devices", {}).items()}
+                users = config.get("users", {})
+            except (OSError, ValueError, AttributeError) as e:
+                log.error("Could not load %s, keeping the previous devices: %s", self.path, e)
+                self._stamp = stamp
+                return
+            if self.override is not None:
+                log.warning("MACROLINK_DEVICES is set, ignoring the devices in %s (its users still apply)", self.path)
+                devices = self.override
+            else:
+                log.info("Devices loaded from %s", self.path)
+        self._stamp = stamp
+        self._configured = (devices, users)
+        self._rebuild()
+
+    def _rebuild(self):
+        devices, users = self._configured
+        merged = {name: url for name, (url, _) in self._discovered.items() if name not in devices}
+        merged.update(devices)
+        targets = dict(merged)
+        targets.update({user: merged[name] for user, name in users.items() if name in merged})
+        removed = set(self._names) - set(merged.values())
+        self._names = {url: name for name, url in merged.items()}
+        # A device without a configured user is addressed by its own name (target() accepts both)
+        owners = {}
+        for user, name in users.items():
+            owners.setdefault(name, user)
+        self._users = {name: owners.get(name, name) for name in merged}
+        self._targets = targets
+        self.devices = MappingProxyType(merged)
+        self.version += 1
+        for base_url in removed:
+            for hook in self._removed_hooks:
+                hook(base_url)
+
+    def on_removed(self, hook):
+        # hook(base_url) runs whenever a reload or discovery expiry drops that address
+        self._removed_hooks.append(hook)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at <= DEVICE_RELOAD_INTERVAL:
+            return
+        with self._lock:
+            if now - self._checked_at <= DEVICE_RELOAD_INTERVAL:
+                return
+            self._checked_at = now
+            if not self._started:
+                self.start()
+            expired = [name for name, (_, seen) in self._discovered.items() if now - seen > self.discovery_ttl]
+            for name in expired:
+                log.info("Discovered device %s stopped announcing, removing it", name, extra={"device": name})
+                del self._discovered[name]
+            self._load()
+            if expired:
+                self._rebuild()
+
+    def target(self, user):
+        self._maybe_reload()
+        return self._targets.get(user)
+
+    def name_for(self, base_url):
+        return self._names.get(base_url, base_url)
+
+    def all(self):
+        self._maybe_reload()
+        return self.devices
+
+    def users(self):
+        # [(device name, user key)] in registry order, for the UI's device selector
+        self._maybe_reload()
+        return list(self._users.items())
+
+    def announce(self, name, base_url):
+        with self._lock:
+            known = self._discovered.get(name)
+            self._discovered[name] = (base_url, time.monotonic())
+            if known is None or known[0] != base_url:
+                log.info("Discovered device %s at %s", name, base_url, extra={"device": name})
+                self._rebuild()
+
+    def start(self):
+        self._started = True
+        if self.discovery_port:
+            Thread(target=self._listen, name="device-discovery", daemon=True).start()
+
+    def _listen(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind(("", self.discovery_port))
+        except OSError as e:
+            log.error("Device discovery disabled, cannot listen on UDP %s: %s", self.discovery_port, e)
+            return
+        while True:
+            packet, (host, _) = sock.recvfrom(1024)
+            try:
+                data = json.loads(packet)
+                name = str(data["name"])
+                base_url = data.get("url") or f"http://{host}:{int(data.get('port', 8888))}"
+            except (ValueError, KeyError, TypeError, AttributeError):
+                continue
+            self.announce(name, base_url.rstrip('/'))
+
+
+device_registry = DeviceRegistry(DEVICE_CONFIG_PATH, PICO_IPS, USER_DEVICES, override=ENV_DEVICES)
+
+# Persistent HTTP sessions per device so triggers reuse a warm keep-alive
+# connection instead of paying a fresh TCP handshake on every button press.
+PICO_POOL_SIZE = int(os.environ.get("MACROLINK_POOL_SIZE", 2))
+PICO_KEEPALIVE = os.environ.get("MACROLINK_KEEPALIVE", "1") != "0"
+PICO_IDLE_TIMEOUT = float(os.environ.get("MACROLINK_IDLE_TIMEOUT", 30))
+
+
+def stale_connection(e):
+    # The pooled socket failed (reset or closed by the device), as opposed to a fresh
+    # connect being refused or timing out, where reconnecting would only fail again
+    if isinstance(e, requests.exceptions.Timeout):
+        return False
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return not isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class DevicePool:
+    def __init__(self, pool_size=PICO_POOL_SIZE, keepalive=PICO_KEEPALIVE, idle_timeout=PICO_IDLE_TIMEOUT):
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self._sessions = {}  # base_url -> [session, last_used]
+        self._lock = Lock()
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["Connection"] = "keep-alive" if self.keepalive else "close"
+        return session
+
+    def session(self, base_url):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(base_url)
+            if entry is None:
+                entry = self._sessions[base_url] = [self._new_session(), now]
+            elif self.idle_timeout and now - entry[1] > self.idle_timeout:
+                # The Pico drops idle sockets on its own; don't wait for a failed send to find out
+                entry[0].close()
+            entry[1] = now
+            return entry[0]
+
+    def reset(self, base_url):
+        with self._lock:
+            entry = self._sessions.get(base_url)
+            if entry:
+                entry[0].close()
+
+    def request(self, method, base_url, path, timeout, retry=False, **kwargs):
+        # retry=True only for reads that are safe to send twice (status): a trigger,
+        # reboot or slot request may already have run when its connection drops
+        url = f"{base_url}/{path.lstrip('/')}"
+        request_id = request_id_var.get()
+        if request_id:
+            kwargs["headers"] = {"X-Request-ID": request_id, **(kwargs.get("headers") or {})}
+        try:
+            return self.session(base_url).request(method, url, timeout=timeout, **kwargs)
+        except requests.exceptions.ConnectionError as e:
+            if not retry or not stale_connection(e):
+                raise
+            # Stale keep-alive socket (device rebooted or closed it): reconnect once
+            self.reset(base_url)
+            return self.session(base_url).request(method, url, timeout=timeout, **kwargs)
+
+    def get(self, base_url, path, timeout, retry=False):
+        return self.request("GET", base_url, path, timeout, retry=retry)
+
+    def post(self, base_url, path, timeout, json=None):
+        return self.request("POST", base_url, path, timeout, json=json)
+
+    def close(self):
+        with self._lock:
+            for session, _ in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+device_pool = DevicePool()
+
+# Per-device circuit breakers. After BREAKER_FAILURE_THRESHOLD consecutive
+# connection failures/timeouts a device is "open": triggers and status polls
+# fail immediately while a background probe retries it with exponential
+# backoff ("half_open" while the probe is in flight) until it answers again.
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("MACROLINK_BREAKER_FAILURES", 3))
+BREAKER_PROBE_INTERVAL = float(os.environ.get("MACROLINK_BREAKER_PROBE_INTERVAL", 1))
+BREAKER_PROBE_MAX_INTERVAL = float(os.environ.get("MACROLINK_BREAKER_PROBE_MAX_INTERVAL", 30))
+BREAKER_PROBE_TIMEOUT = 1
+
+
+class DeviceUnavailable(requests.exceptions.RequestException):
+    pass
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, base_url, threshold=BREAKER_FAILURE_THRESHOLD,
+                 probe_interval=BREAKER_PROBE_INTERVAL, probe_max_interval=BREAKER_PROBE_MAX_INTERVAL):
+        self.base_url = base_url
+        self.threshold = threshold
+        self.probe_interval = probe_interval
+        self.probe_max_interval = probe_max_interval
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.next_probe_at = None
+        self._backoff = probe_interval
+        self._probe = None  # the one probe thread while the circuit is not closed
+        self._retired = False  # the device left the registry: stop probing it
+        self._lock = Lock()
+
+    def allow(self):
+        return self.state == self.CLOSED
+
+    def record_success(self):
+        if self.state == self.CLOSED and not self.failures:
+            return
+        with self._lock:
+            if self.state != self.CLOSED:
+                log.info("%s is reachable again, closing circuit", self.base_url,
+                         extra={"device": device_name(self.base_url)})
+                self._transition(self.CLOSED)
+            self.failures = 0
+            self._backoff = self.probe_interval
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.CLOSED and self.failures >= self.threshold:
+                log.warning("%s failed %d times in a row, opening circuit", self.base_url, self.failures,
+                            extra={"device": device_name(self.base_url)})
+                self.opened_at = time.monotonic()
+                self._open()
+                if self._probe is None:
+                    self._probe = Thread(target=self._probe_loop, name=f"probe-{self.base_url}", daemon=True)
+                    self._probe.start()
+
+    def _open(self):
+        self.next_probe_at = time.monotonic() + self._backoff
+        self._transition(self.OPEN)
+
+    def _transition(self, state):
+        global breaker_transitions
+        self.state = state
+        breaker_transitions += 1
+        events.publish("circuit", {"device": device_name(self.base_url), "state": state, "failures": self.failures})
+
+    def _probe_loop(self):
+        # Exits as soon as the circuit is closed, whether by this probe or by a request
+        # that got through. _probe is cleared under the lock, so a later trip starts a new one.
+        while True:
+            while self.next_probe_at > time.monotonic():  # re-read: a re-trip pushes it back
+                time.sleep(self.next_probe_at - time.monotonic())
+            with self._lock:
+                if self._retired:
+                    self._probe = None
+                    return
+            # A probe is a status read: it takes a limiter slot like any poll, and a busy device
+            # delays it by one probe interval without growing the backoff
+            limiter = limiter_for(self.base_url)
+            if not limiter.try_acquire(DeviceLimiter.STATUS):
+                with self._lock:
+                    if self.state == self.CLOSED:
+                        self._probe = None
+                        return
+                    self.next_probe_at = time.monotonic() + self.probe_interval
+                continue
+            with self._lock:
+                if self.state == self.CLOSED:
+                    limiter.release()
+                    self._probe = None
+                    return
+                self._transition(self.HALF_OPEN)
+            try:
+                device_pool.get(self.base_url, "/system/status.json", timeout=BREAKER_PROBE_TIMEOUT, retry=True)
+            except requests.exceptions.RequestException:
+                with self._lock:
+                    if self.state != self.CLOSED:
+                        self._backoff = min(self._backoff * 2, self.probe_max_interval)
+                        self._open()
+                continue
+            finally:
+                limiter.release()
+            self.record_success()
+
+    def retire(self):
+        with self._lock:
+            self._retired = True
+
+    def snapshot(self):
+        now = time.monotonic()
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "open_for": round(now - self.opened_at, 1) if self.state != self.CLOSED else None,
+            "next_probe_in": round(max(0, self.next_probe_at - now), 1) if self.state == self.OPEN else None,
+        }
+
+
+breakers = {}
+breaker_transitions = 0  # part of the status ETag, so circuit changes are never served as 304
+breakers_lock = Lock()
+
+
+def breaker_for(base_url):
+    breaker = breakers.get(base_url)
+    if breaker is None:
+        with breakers_lock:
+            breaker = breakers.setdefault(base_url, CircuitBreaker(base_url))
+    return breaker
+
+
+def record_device_result(base_url, error_kind=None):
+    # Only an unreachable device counts against the circuit, not an HTTP error reply
+    if error_kind in ("timeout", "connection"):
+        breaker_for(base_url).record_failure()
+    elif error_kind is None or error_kind == "http":
+        breaker_for(base_url).record_success()
+
+# Per-device admission control. The Pico's HTTP server has very little memory
+# and falls into server recovery under bursts, so every request forwarded to a
+# device takes a token from its bucket (MACROLINK_DEVICE_RATE per second, up to
+# MACROLINK_DEVICE_BURST) and one of its MACROLINK_DEVICE_INFLIGHT slots.
+# Triggers and control requests may wait briefly for room, triggers first.
+# Status polls and breaker probes never wait and leave the last token and slot
+# to triggers. The limits are per process: N workers allow N times the rate.
+DEVICE_RATE = float(os.environ.get("MACROLINK_DEVICE_RATE", 10))  # 0 disables the token bucket
+DEVICE_BURST = int(os.environ.get("MACROLINK_DEVICE_BURST", 5))
+DEVICE_MAX_INFLIGHT = int(os.environ.get("MACROLINK_DEVICE_INFLIGHT", PICO_POOL_SIZE))
+DEVICE_MAX_WAITING = int(os.environ.get("MACROLINK_DEVICE_QUEUE", 8))
+DEVICE_MAX_WAIT = float(os.environ.get("MACROLINK_DEVICE_WAIT_MS", 250)) / 1000
+DEVICE_LIMITS = os.environ.get("MACROLINK_DEVICE_LIMITS", "1") != "0"  # 0: count only, never throttle (benchmarks)
+
+
+class DeviceBusy(DeviceUnavailable):
+    # reason "rate_limited" (out of tokens, HTTP 429) or "saturated" (no free slot, HTTP 503)
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Device busy ({reason.replace('_', ' ')})")
+        self.reason = reason
+        self.status = 429 if reason == "rate_limited" else 503
+        self.retry_after = retry_after
+
+
+class DeviceLimiter:
+    TRIGGER, CONTROL, STATUS = 0, 1, 2
+    PRIORITIES = ("trigger", "control", "status")
+
+    def __init__(self, base_url, rate=DEVICE_RATE, burst=DEVICE_BURST, max_inflight=DEVICE_MAX_INFLIGHT,
+                 max_waiting=DEVICE_MAX_WAITING, max_wait=DEVICE_MAX_WAIT, enabled=DEVICE_LIMITS):
+        self.base_url = base_url
+        self.enabled = enabled
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_inflight = max(1, max_inflight)
+        self.max_waiting = max_waiting
+        self.max_wait = (max_wait, max_wait, 0)  # per priority
+        self.tokens = float(self.burst)
+        self.inflight = 0
+        self.waiting = [0, 0, 0]  # per priority
+        self.rejected = {"rate_limited": 0, "saturated": 0}
+        self.version = 0  # bumped with every change to the counters above, for the status ETag
+        self._refilled_at = time.monotonic()
+        self._cond = threading.Condition(Lock())
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate)
+        else:
+            self.tokens = self.burst
+        self._refilled_at = now
+
+    def _needed(self, priority):
+        # Tokens and slots a request must find; status polls leave one of each for triggers
+        reserve = 1 if priority == self.STATUS else 0
+        return 1 + (reserve if self.burst > 1 else 0), 1 + (reserve if self.max_inflight > 1 else 0)
+
+    def _blocked(self, priority):
+        # None if a request of this priority may start now, else the reason it may not
+        if not self.enabled:
+            return None
+        tokens, slots = self._needed(priority)
+        if any(self.waiting[:priority]) or self.inflight + slots > self.max_inflight:
+            return "saturated"
+        if self.tokens < tokens:
+            return "rate_limited"
+        return None
+
+    def _retry_after(self, priority, reason):
+        if reason == "rate_limited" and self.rate > 0:
+            return round((self._needed(priority)[0] - self.tokens) / self.rate, 3)
+        return 1.0
+
+    def _start(self):
+        if self.enabled:
+            self.tokens -= 1
+        self.inflight += 1
+        self.version += 1
+
+    def try_acquire(self, priority):
+        with self._cond:
+            self._refill()
+            if self._blocked(priority):
+                return False
+            self._start()
+            return True
+
+    def enqueue(self, priority):
+        # Registers a waiter; False if this priority may not wait or the wait queue is full
+        with self._cond:
+            if not self.max_wait[priority] or sum(self.waiting) >= self.max_waiting:
+                return False
+            self.waiting[priority] += 1
+            self.version += 1
+            return True
+
+    def dequeue(self, priority):
+        with self._cond:
+            self.waiting[priority] -= 1
+            self.version += 1
+            self._cond.notify_all()  # lower priorities may have been held back by this waiter
+
+    def reject(self, priority):
+        # Counts the rejection and returns the DeviceBusy to raise
+        with self._cond:
+            self._refill()
+            reason = self._blocked(priority) or "saturated"
+            self.rejected[reason] += 1
+            self.version += 1
+            return DeviceBusy(reason, self._retry_after(priority, reason))
+
+    def acquire(self, priority):
+        if self.try_acquire(priority):
+            return
+        if self.enqueue(priority):
+            deadline = time.monotonic() + self.max_wait[priority]
+            try:
+                with self._cond:
+                    while True:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        # Woken by release(), or when the next token is due
+                        self._cond.wait(min(remaining, 1 / self.rate) if self.rate > 0 else remaining)
+                        self._refill()
+                        if not self._blocked(priority):
+                            self._start()
+                            return
+            finally:
+                self.dequeue(priority)
+        raise self.reject(priority)
+
+    def release(self):
+        with self._cond:
+            self.inflight -= 1
+            self.version += 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority):
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self):
+        with self._cond:
+            self._refill()
+            return {
+                "enabled": self.enabled,
+                "rate": self.rate,
+                "burst": self.burst,
+                "tokens": round(self.tokens, 2),
+                "max_inflight": self.max_inflight,
+                "inflight": self.inflight,
+                "max_waiting": self.max_waiting,
+                "waiting": dict(zip(self.PRIORITIES, self.waiting)),
+                "rejected": dict(self.rejected),
+            }
+
+
+limiters = {}
+limiters_lock = Lock()
+
+
+def limiter_for(base_url):
+    limiter = limiters.get(base_url)
+    if limiter is None:
+        with limiters_lock:
+            limiter = limiters.setdefault(base_url, DeviceLimiter(base_url))
+    return limiter
+
+
+def busy_response(e, payload):
+    response = jsonify(dict(payload, status="error", message=str(e), retry_after=e.retry_after))
+    response.headers["Retry-After"] = str(max(1, math.ceil(e.retry_after)))
+    return response, e.status
+
+# Server-sent events (/events). Everything is published once into the shared
+# broadcaster and fanned out to each connected client's bounded queue: status
+# diffs from the one status poller, circuit changes, profile edits and trigger
+# outcomes. A client that falls EVENT_QUEUE_SIZE messages behind is dropped and
+# resyncs from the snapshot it gets when its EventSource reconnects.
+EVENT_QUEUE_SIZE = 256
+EVENT_KEEPALIVE = 15
+
+
+def format_event(event, data, event_id=None):
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class EventSubscriber:
+    def __init__(self, size=EVENT_QUEUE_SIZE):
+        self.queue = queue.Queue(size)
+        self.dropped = False
+
+    def deliver(self, message):
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except queue.Full:
+            self.dropped = True
+            return False
+
+
+class EventBroadcaster:
+    def __init__(self):
+        self._subscribers = set()
+        self._next_id = 1
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.add(subscriber)
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        if not self._subscribers:
+            return
+        with self._lock:
+            message = format_event(event, data, self._next_id)
+            self._next_id += 1
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if not subscriber.deliver(message):
+                log.warning("Dropping slow event stream client")
+                self.unsubscribe(subscriber)
+
+
+events = EventBroadcaster()
+
+
+MISSING = object()
+
+
+def status_diff(old, new):
+    # Per device: {"set": {changed fields}, "unset": [removed fields]}; None for a device that went away
+    diff = {}
+    for pico_id, entry in new.items():
+        previous = old.get(pico_id, {})
+        changed = {key: value for key, value in entry.items() if previous.get(key, MISSING) != value}
+        removed = [key for key in previous if key not in entry]
+        if changed or removed:
+            diff[pico_id] = {"set": changed, "unset": removed}
+    for pico_id in old:
+        if pico_id not in new:
+            diff[pico_id] = None
+    return diff
+
+# Telemetry history: every successful status poll appends one sample per device
+# to fixed-size ring buffers (one typed array per metric, NaN where a value was
+# missing), so a long session costs TELEMETRY_SAMPLES * 28 bytes per device.
+TELEMETRY_SAMPLES = int(os.environ.get("MACROLINK_TELEMETRY_SAMPLES", 4320))  # 6 h at the default poll interval
+TELEMETRY_MAX_BUCKETS = 2000
+TELEMETRY_DEFAULT_BUCKETS = 200
+TELEMETRY_METRICS = {
+    "cpu_temp": lambda data: data.get("cpu_temp"),
+    "memory": lambda data: (data.get("memory") or {}).get("percent_used"),
+    "rssi": lambda data: data.get("rssi"),
+    "http_requests": lambda data: data.get("http_requests"),
+    "uptime": lambda data: data.get("uptime"),
+}
+
+
+class TelemetrySeries:
+    def __init__(self, capacity=TELEMETRY_SAMPLES):
+        self.capacity = capacity
+        self.times = array.array('d', bytes(8 * capacity))
+        self.values = {metric: array.array('f', bytes(4 * capacity)) for metric in TELEMETRY_METRICS}
+        self.start = 0  # slot of the oldest sample
+        self.count = 0
+
+    def append(self, timestamp, data):
+        slot = (self.start + self.count) % self.capacity
+        if self.count == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+        else:
+            self.count += 1
+        self.times[slot] = timestamp
+        for metric, extract in TELEMETRY_METRICS.items():
+            value = extract(data)
+            self.values[metric][slot] = value if isinstance(value, (int, float)) else math.nan
+
+    def _slot(self, i):
+        return (self.start + i) % self.capacity
+
+    def _bisect(self, timestamp):
+        # First logical index with time >= timestamp; samples are appended in time order
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.times[self._slot(mid)] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(self, start, end, resolution, metrics):
+        buckets = {}  # bucket index -> {metric: [min, max, sum, count]}
+        resets = []
+        last_uptime = None
+        uptime = self.values["uptime"]
+        for i in range(self._bisect(start), self._bisect(end)):
+            slot = self._slot(i)
+            timestamp = self.times[slot]
+            if uptime[slot] == uptime[slot]:  # not NaN
+                if last_uptime is not None and uptime[slot] < last_uptime:
+                    resets.append(timestamp)
+                last_uptime = uptime[slot]
+            bucket = buckets.setdefault(int((timestamp - start) // resolution), {})
+            for metric in metrics:
+                value = self.values[metric][slot]
+                if value != value:
+                    continue
+                agg = bucket.get(metric)
+                if agg is None:
+                    bucket[metric] = [value, value, value, 1]
+                else:
+                    agg[0] = min(agg[0], value)
+                    agg[1] = max(agg[1], value)
+                    agg[2] += value
+                    agg[3] += 1
+
+        order = sorted(buckets)
+        result = {"t": [start + index * resolution for index in order], "metrics": {}, "resets": resets}
+        for metric in metrics:
+            aggs = [buckets[index].get(metric) for index in order]
+            result["metrics"][metric] = {
+                "min": [round(agg[0], 2) if agg else None for agg in aggs],
+                "max": [round(agg[1], 2) if agg else None for agg in aggs],
+                "avg": [round(agg[2] / agg[3], 2) if agg else None for agg in aggs],
+            }
+        return result
+
+
+class TelemetryHistory:
+    def __init__(self, capacity=TELEMETRY_SAMPLES):
+        self.capacity = capacity
+        self._series = {}  # pico_id -> TelemetrySeries
+        self._lock = Lock()
+
+    def record(self, results):
+        timestamp = time.time()
+        with self._lock:
+            for pico_id, (data, error, _) in results.items():
+                if error is None and isinstance(data, dict):
+                    series = self._series.get(pico_id)
+                    if series is None:
+                        series = self._series[pico_id] = TelemetrySeries(self.capacity)
+                    series.append(timestamp, data)
+
+    def devices(self):
+        return list(self._series)
+
+    def query(self, pico_id, start, end, resolution, metrics):
+        with self._lock:
+            series = self._series.get(pico_id)
+            if series is None:
+                return None
+            return series.query(start, end, resolution, metrics)
+
+
+telemetry = TelemetryHistory()
+
+# Device status is polled in the background and served from memory, so a dead
+# device or many open dashboards never multiply the load on the Picos.
+STATUS_POLL_INTERVAL = float(os.environ.get("MACROLINK_STATUS_INTERVAL", 5))
+STATUS_TIMEOUT = float(os.environ.get("MACROLINK_STATUS_TIMEOUT", 2))
+STATUS_MAX_AGE = float(os.environ.get("MACROLINK_STATUS_MAX_AGE", STATUS_POLL_INTERVAL * 2))
+# A poll cycle is cut off after STATUS_CYCLE_DEADLINE however many devices there
+# are; devices that haven't answered by then are reported as timed out, and
+# their outstanding request is picked up by the next cycle instead of a new one.
+STATUS_POLL_WORKERS = int(os.environ.get("MACROLINK_STATUS_WORKERS", 16))
+STATUS_CYCLE_DEADLINE = float(os.environ.get("MACROLINK_STATUS_DEADLINE", STATUS_TIMEOUT * 2))
+
+
+class StatusPoller:
+    def __init__(self, registry, interval=STATUS_POLL_INTERVAL, timeout=STATUS_TIMEOUT, max_age=STATUS_MAX_AGE,
+                 workers=STATUS_POLL_WORKERS, deadline=STATUS_CYCLE_DEADLINE):
+        self.registry = registry
+        self.interval = interval
+        self.timeout = timeout
+        self.max_age = max_age
+        self.deadline = deadline
+        self._snapshot = {}  # pico_id -> (data or None, error or None, polled_at monotonic)
+        self._pending = {}  # pico_id -> future of a poll that outlived its cycle
+        self._published = {}  # the render() the last status diff was taken against
+        self._polled_at = None
+        self.generation = 0
+        self._inflight = None
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="status-poll")
+
+    @property
+    def devices(self):
+        return self.registry.all()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = Thread(target=self._run, name="status-poller", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                log.error("Status poll failed: %s", e)
+            self._stop.wait(self.interval)
+
+    def skipped(self, pico_id):
+        # A poll the device had no room for: keep serving the last result rather than an error.
+        # store() tells it apart by identity, so it is not recorded as a new sample.
+        upstream_errors.inc(pico_id, "status", "busy")
+        return self._snapshot.get(pico_id) or (None, "Device busy", time.monotonic())
+
+    def _poll_device(self, pico_id, pico_url):
+        if not breaker_for(pico_url).allow():
+            return None, "Device unavailable (circuit open)", time.monotonic()
+        limiter = limiter_for(pico_url)
+        if not limiter.try_acquire(DeviceLimiter.STATUS):
+            return self.skipped(pico_id)
+        start = time.perf_counter()
+        try:
+            r = device_pool.get(pico_url, "/system/status.json", timeout=self.timeout, retry=True)
+            data = r.json()
+        except Exception as e:
+            error_kind = requests_error_kind(e)
+            record_device_result(pico_url, error_kind)
+            record_status_poll(pico_id, time.perf_counter() - start, error_kind)
+            return None, str(e), time.monotonic()
+        finally:
+            limiter.release()
+        record_device_result(pico_url)
+        record_status_poll(pico_id, time.perf_counter() - start)
+        return data, None, time.monotonic()
+
+    def refresh(self):
+        # Single flight: callers arriving while a poll is running wait for it instead of starting another
+        with self._lock:
+            inflight = self._inflight
+            if inflight is None:
+                inflight = self._inflight = Event()
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            inflight.wait()
+            return
+
+        try:
+            start = time.perf_counter()
+            futures = {}
+            for pico_id, pico_url in self.devices.items():
+                # A poll left over from the last cycle is reused: still waited on, or its late result served
+                futures[pico_id] = self._pending.get(pico_id) or \
+                    self._executor.submit(self._poll_device, pico_id, pico_url)
+            wait(futures.values(), timeout=self.deadline)
+            results, self._pending = {}, {}
+            for pico_id, future in futures.items():
+                if future.done():
+                    results[pico_id] = future.result()
+                else:
+                    self._pending[pico_id] = future
+                    results[pico_id] = (None, "Status poll timed out", time.monotonic())
+            self.store(results)
+            status_cycle_latency.observe(time.perf_counter() - start)
+        finally:
+            with self._lock:
+                self._inflight = None
+            inflight.set()
+
+    def store(self, results):
+        # results: pico_id -> (data or None, error or None, polled_at monotonic)
+        with self._lock:
+            previous = self._snapshot
+            self._snapshot = results
+            self._polled_at = time.monotonic()
+            self.generation += 1
+        # Skipped polls carry the previous result object itself; only fresh ones are samples
+        fresh = {pico_id: result for pico_id, result in results.items() if result is not previous.get(pico_id)}
+        telemetry.record(fresh)
+        devices = self.devices
+        for pico_id, (data, _, _) in fresh.items():
+            if isinstance(data, dict) and pico_id in devices:
+                loadouts.check(devices[pico_id], data)
+        if events:
+            # Diffed over the whole rendered entry, so circuit, limits, loadout and poll_age
+            # follow along; circuit changes between polls also go out as "circuit" events
+            published = self.render()
+            diff = status_diff(self._published, published)
+            self._published = published
+            if diff:
+                events.publish("status", diff)
+        else:
+            self._published = {}  # nobody to diff for: the next subscriber starts from a snapshot
+
+    def is_stale(self):
+        polled_at = self._polled_at
+        return polled_at is None or time.monotonic() - polled_at > self.max_age
+
+    def snapshot(self):
+        self.start()
+        if self.is_stale():
+            self.refresh()
+        return self.render()
+
+    def render(self):
+        now = time.monotonic()
+        devices = self.devices
+        results = {}
+        for pico_id, (data, error, entry_polled_at) in self._snapshot.items():
+            if pico_id not in devices:
+                continue  # removed from the registry since the last poll
+            entry = status_entry(data, error)
+            entry["poll_age"] = round(now - entry_polled_at, 3)
+            entry["circuit"] = breaker_for(devices[pico_id]).snapshot()
+            entry["limits"] = limiter_for(devices[pico_id]).snapshot()
+            loadout = loadouts.snapshot(devices[pico_id])
+            if loadout:
+                entry["loadout"] = loadout
+            results[pico_id] = entry
+        return results
+
+
+def status_entry(data, error):
+    entry = dict(data) if isinstance(data, dict) else {}
+    if error is not None:
+        entry["error"] = error
+    return entry
+
+
+status_poller = StatusPoller(device_registry)
+
+
+def status_etag():
+    # Weak validator: only the live poll_age/timer/token values differ within one tag. Every other
+    # field comes from the poll, the breakers, the limiters, the loadouts or the registry.
+    limits = sum(limiter.version for limiter in list(limiters.values()))
+    return (f"s-{INSTANCE_ID}-{status_poller.generation}-{breaker_transitions}-{limits}-{loadouts.version}"
+            f"-{device_registry.version}")
+
+
 @app.route("/dashboard/status.json")
 def combined_status():
-    results = {}
-    for pico_id, pico_url in PICO_IPS.items():
+    status_poller.start()
+    if status_poller.is_stale():
+        status_poller.refresh()
+    # Tag first, then render: a poll landing in between only makes the body newer than
+    # its tag (revalidated next time), never an old body under the new generation's tag
+    etag = status_etag()
+    return conditional_json(status_poller.render(), etag=etag, weak=True)
+
+
+@app.route("/devices.json")
+def list_devices():
+    # The UI builds its device selector from this instead of a hard-coded green/blue map,
+    # and only pushes loadouts when the backend has loadout sync enabled
+    return conditional_json({"devices": [{"name": name, "user": user} for name, user in device_registry.users()],
+                             "loadout_sync": LOADOUT_SYNC})
+
+
+@app.route("/dashboard/history.json")
+def telemetry_history():
+    # ?device=green&metrics=cpu_temp,rssi&start=<unix>&end=<unix>&resolution=<seconds per bucket>
+    now = time.time()
+    try:
+        end = float(request.args.get("end", now))
+        start = float(request.args.get("start", end - 3600))
+        resolution = float(request.args.get("resolution", 0)) or (end - start) / TELEMETRY_DEFAULT_BUCKETS
+    except ValueError:
+        return jsonify({"error": "start, end and resolution must be numbers"}), 400
+    if not all(math.isfinite(value) for value in (start, end, resolution)):
+        # float() accepts "nan" and "inf", which would turn into an unbounded bucket loop
+        return jsonify({"error": "start, end and resolution must be finite"}), 400
+    if end <= start or resolution <= 0:
+        return jsonify({"error": "Empty time range"}), 400
+    resolution = max(resolution, (end - start) / TELEMETRY_MAX_BUCKETS)
+
+    metrics = request.args.get("metrics")
+    metrics = metrics.split(',') if metrics else list(TELEMETRY_METRICS)
+    unknown = [metric for metric in metrics if metric not in TELEMETRY_METRICS]
+    if unknown:
+        return jsonify({"error": "Unknown metric", "unknown": unknown}), 400
+
+    device = request.args.get("device")
+    if device and device not in telemetry.devices():
+        return jsonify({"error": "No history for device"}), 404
+    devices = [device] if device else telemetry.devices()
+    return jsonify({"start": start, "end": end, "resolution": resolution,
+                    "devices": {pico_id: telemetry.query(pico_id, start, end, resolution, metrics)
+                                for pico_id in devices}})
+
+
+REBOOT_TIMEOUT = 2
+
+
+@app.route("/dashboard/reboot/<pico_id>", methods=["POST"])
+def reboot_device(pico_id):
+    # Goes through the device's limiter like every other forwarded request
+    base_url = device_registry.all().get(pico_id)
+    if not base_url:
+        return jsonify({"error": "Unknown device"}), 404
+    if not breaker_for(base_url).allow():
+        return jsonify({"status": "error", "message": "Device unavailable (circuit open)"}), 503
+    try:
+        with limiter_for(base_url).slot(DeviceLimiter.CONTROL):
+            device_pool.get(base_url, "/system/reboot", timeout=REBOOT_TIMEOUT).raise_for_status()
+    except DeviceBusy as e:
+        return busy_response(e, {"device": pico_id})
+    except requests.exceptions.RequestException as e:
+        log.error("Reboot of %s failed: %s", pico_id, e, extra={"device": pico_id})
+        return jsonify({"status": "error", "device": pico_id, "message": str(e)}), 502
+    log.info("Reboot requested for %s", pico_id, extra={"device": pico_id})
+    return jsonify({"status": "rebooting", "device": pico_id})
+
+
+@app.route("/events")
+def event_stream():
+    subscriber = EventSubscriber()
+    events.subscribe(subscriber)
+
+    def stream():
         try:
-            r = requests.get(f"{pico_url}/system/status.json", timeout=2)
-            results[pico_id] = r.json()
-        except Exception as e:
-            results[pico_id] = {"error": str(e)}
-    return jsonify(results)
+            # Subscribed first, so nothing published while the snapshot renders is missed
+            yield format_event("snapshot", status_poller.snapshot())
+            while not subscriber.dropped:
+                try:
+                    yield subscriber.queue.get(timeout=EVENT_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            events.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+TRIGGER_TIMEOUT = 1
+
+
+def send_trigger(target_server, macro, user):
+    if not breaker_for(target_server).allow():
+        upstream_errors.inc(device_name(target_server), "trigger", "circuit_open")
+        raise DeviceUnavailable("Device unavailable (circuit open)")
+    limiter = limiter_for(target_server)
+    try:
+        limiter.acquire(DeviceLimiter.TRIGGER)
+    except DeviceBusy as e:
+        upstream_errors.inc(device_name(target_server), "trigger", e.reason)
+        raise
+    start = time.perf_counter()
+    try:
+        response = device_pool.get(target_server, loadouts.trigger_path(target_server, macro), timeout=TRIGGER_TIMEOUT)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        error_kind = requests_error_kind(e)
+        record_device_result(target_server, error_kind)
+        record_trigger(user, target_server, macro, time.perf_counter() - start, error_kind)
+        raise
+    finally:
+        limiter.release()
+    elapsed = time.perf_counter() - start
+    record_device_result(target_server)
+    record_trigger(user, target_server, macro, elapsed)
+    return elapsed
+
 
 @app.route("/trigger/<macro>")
 def trigger_macro(macro):
     selected_user = request.args.get("user", "user1")
-    server_map = {
-        "user1": "http://192.168.50.34:8888",
-        "user2": "http://192.168.50.35:8888"
-    }
-    target_server = server_map.get(selected_user)
+    target_server = device_registry.target(selected_user)
 
     if not target_server:
         return jsonify({"error": "Invalid user"}), 400
+
+    macro_key = resolve_macro(macro)
+    if macro_key is None:
+        return jsonify({"status": "error", "macro": macro, "message": "Unknown macro"}), 404
+    macro = macro_key
     
-    print(f"Triggering macro '{macro}' for user '{selected_user}' → {target_server}")
+    log.info("Triggering macro '%s' for user '%s' → %s", macro, selected_user, target_server,
+             extra={"macro": macro, "user": selected_user, "device": device_name(target_server)})
 
     try:
-        response = requests.get(f"{target_server}/{macro}", timeout=1)
-        response.raise_for_status()
+        send_trigger(target_server, macro, selected_user)
         return jsonify({"status": "success", "macro": macro})
+    except DeviceBusy as e:
+        return busy_response(e, {"macro": macro})
+    except DeviceUnavailable as e:
+        return jsonify({"status": "error", "macro": macro, "message": str(e)}), 503
     except requests.exceptions.RequestException as e:
-        print(f"Error triggering macro '{macro}': {e}")
+        log.error("Error triggering macro '%s': %s", macro, e, extra={"macro": macro})
         return jsonify({"status": "error", "macro": macro, "message": 
         str(e)}), 500
+
+# Queued triggers: one worker per device delivers presses in order while the
+# web thread returns a ticket straight away. Repeat presses of the same macro
+# inside the coalesce window share the pending ticket instead of re-firing.
+TRIGGER_QUEUE_SIZE = int(os.environ.get("MACROLINK_QUEUE_SIZE", 16))
+TRIGGER_COALESCE_WINDOW = float(os.environ.get("MACROLINK_COALESCE_MS", 300)) / 1000
+TRIGGER_TICKET_HISTORY = 512
+
+trigger_tickets = OrderedDict()  # ticket id -> ticket dict, oldest first
+ticket_lock = Lock()
+
+
+def store_ticket(ticket):
+    with ticket_lock:
+        trigger_tickets[ticket["ticket"]] = ticket
+        while len(trigger_tickets) > TRIGGER_TICKET_HISTORY:
+            trigger_tickets.popitem(last=False)
+
+
+def get_ticket(ticket_id):
+    with ticket_lock:
+        ticket = trigger_tickets.get(ticket_id)
+        return dict(ticket) if ticket else None
+
+
+def update_ticket(ticket, **fields):
+    with ticket_lock:
+        ticket.update(fields)
+
+
+class TriggerDispatcher:
+    def __init__(self, base_url, maxsize=TRIGGER_QUEUE_SIZE, coalesce_window=TRIGGER_COALESCE_WINDOW):
+        self.base_url = base_url
+        self.coalesce_window = coalesce_window
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._last = None  # (macro, ticket, submitted_at) of the newest accepted press
+        self._closed = False
+        self._lock = Lock()
+        self._thread = Thread(target=self._run, name=f"dispatch-{base_url}", daemon=True)
+        self._thread.start()
+
+    def submit(self, macro, user):
+        now = time.monotonic()
+        with self._lock:
+            if self._closed:
+                return None
+            # Only a press still waiting in the queue absorbs a repeat; once it is being
+            # sent (or done) the repeat is a new press of its own
+            if (self._last and self._last[0] == macro and now - self._last[2] <= self.coalesce_window
+                    and self._last[1]["status"] == "queued"):
+                ticket = self._last[1]
+                update_ticket(ticket, coalesced=ticket["coalesced"] + 1)
+                return ticket
+            ticket = {
+                "ticket": uuid.uuid4().hex,
+                "macro": macro,
+                "user": user,
+                "status": "queued",
+                "coalesced": 0,
+                "queued_at": time.time(),
+                "request_id": request_id_var.get(),
+            }
+            try:
+                self.queue.put_nowait(ticket)
+            except queue.Full:
+                return None
+            self._last = (macro, ticket, now)
+        store_ticket(ticket)
+        return ticket
+
+    def close(self):
+        # Fails the presses still queued and ends the worker after the one it is sending
+        with self._lock:
+            self._closed = True
+            self._last = None
+            while True:
+                try:
+                    ticket = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                update_ticket(ticket, status="error", message="Device removed", finished_at=time.time())
+                self.queue.task_done()
+            self.queue.put_nowait(None)
+
+    def _run(self):
+        while True:
+            ticket = self.queue.get()
+            if ticket is None:
+                return
+            request_id_var.set(ticket["request_id"])
+            with self._lock:  # submit() coalesces only into "queued" tickets
+                update_ticket(ticket, status="sending")
+            try:
+                send_trigger(self.base_url, ticket["macro"], ticket["user"])
+                update_ticket(ticket, status="success", finished_at=time.time())
+            except requests.exceptions.RequestException as e:
+                log.error("Error triggering macro '%s': %s", ticket["macro"], e, extra={"macro": ticket["macro"]})
+                update_ticket(ticket, status="error", message=str(e), finished_at=time.time())
+            finally:
+                self.queue.task_done()
+
+
+dispatchers = {}
+dispatcher_lock = Lock()
+
+
+def get_dispatcher(base_url):
+    with dispatcher_lock:
+        dispatcher = dispatchers.get(base_url)
+        if dispatcher is None:
+            dispatcher = dispatchers[base_url] = TriggerDispatcher(base_url)
+        return dispatcher
+
+
+def forget_device(base_url):
+    # The registry no longer has this address: drop its breaker, limiter and dispatcher so
+    # they stop counting in the status ETag and their probe and worker threads exit
+    with breakers_lock:
+        breaker = breakers.pop(base_url, None)
+    if breaker is not None:
+        breaker.retire()
+    with limiters_lock:
+        limiters.pop(base_url, None)
+    with dispatcher_lock:
+        dispatcher = dispatchers.pop(base_url, None)
+    if dispatcher is not None:
+        dispatcher.close()
+
+
+device_registry.on_removed(forget_device)
+
+
+@app.route("/trigger_async/<macro>")
+def trigger_macro_async(macro):
+    selected_user = request.args.get("user", "user1")
+    target_server = device_registry.target(selected_user)
+
+    if not target_server:
+        return jsonify({"error": "Invalid user"}), 400
+
+    macro_key = resolve_macro(macro)
+    if macro_key is None:
+        return jsonify({"status": "error", "macro": macro, "message": "Unknown macro"}), 404
+    macro = macro_key
+
+    ticket = get_dispatcher(target_server).submit(macro, selected_user)
+    if ticket is None:
+        return jsonify({"status": "error", "macro": macro, "message": "Device queue full"}), 503
+    return jsonify({"status": "queued", "macro": macro, "ticket": ticket["ticket"],
+                    "coalesced": ticket["coalesced"] > 0}), 202
+
+
+@app.route("/ticket/<ticket_id>")
+def ticket_status(ticket_id):
+    ticket = get_ticket(ticket_id)
+    if not ticket:
+        return jsonify({"error": "Ticket not found"}), 404
+    return jsonify(ticket)
+
+# Batch triggers: one browser request fires an ordered list of macros, sent to
+# the device back to back over the same pooled keep-alive connection.
+BATCH_MAX_ITEMS = 10
+BATCH_MAX_DELAY_MS = 5000
+
+
+def parse_trigger_batch(data):
+    # Returns (target_server, items, stop_on_error, None) or (None, None, None, (error payload, status))
+    if not isinstance(data, dict):
+        return None, None, None, ({"error": "Expected a JSON object"}, 400)
+    target_server = device_registry.target(data.get("user", "user1"))
+    if not target_server:
+        return None, None, None, ({"error": "Invalid user"}, 400)
+
+    macros = data.get("macros")
+    if not isinstance(macros, list) or not macros:
+        return None, None, None, ({"error": "Missing macros"}, 400)
+    if len(macros) > BATCH_MAX_ITEMS:
+        return None, None, None, ({"error": f"At most {BATCH_MAX_ITEMS} macros per batch"}, 400)
+
+    default_delay = data.get("delay_ms", 0)
+    items, unknown = [], []
+    for entry in macros:
+        macro, delay = (entry.get("macro"), entry.get("delay_ms", default_delay)) if isinstance(entry, dict) \
+            else (entry, default_delay)
+        # bool is an int subclass: true/false are not delays
+        if not isinstance(macro, str) or isinstance(delay, bool) or not isinstance(delay, (int, float)) \
+                or not 0 <= delay <= BATCH_MAX_DELAY_MS:
+            return None, None, None, ({"error": f"Invalid batch entry: {entry}"}, 400)
+        macro_key = resolve_macro(macro)
+        if macro_key is None:
+            unknown.append(macro)
+        items.append((macro_key, delay / 1000))
+    if unknown:
+        return None, None, None, ({"status": "error", "message": "Unknown macro", "unknown": unknown}, 404)
+    stop_on_error = data.get("stop_on_error", True)
+    if not isinstance(stop_on_error, bool):
+        return None, None, None, ({"error": "stop_on_error must be true or false"}, 400)
+    return target_server, items, stop_on_error, None
+
+
+def trigger_error_status(e):
+    # What /trigger/<macro> answers for a send that failed this way
+    if isinstance(e, DeviceBusy):
+        return e.status
+    if isinstance(e, DeviceUnavailable):
+        return 503
+    return 500
+
+
+def batch_failure(macro, e, code):
+    result = {"macro": macro, "status": "error", "code": code, "message": str(e) or type(e).__name__}
+    if getattr(e, "retry_after", None) is not None:
+        result["retry_after"] = e.retry_after
+    return result
+
+
+def batch_response(results):
+    # 200 when every item was sent. Otherwise each item carries its own code: 207 when some
+    # were sent or the failures differ, else the one code they share (429/503 for a busy or
+    # unavailable device, not a server error)
+    codes = {result["code"] for result in results if result["status"] == "error"}
+    if not codes:
+        return {"status": "success", "results": results}, 200
+    sent = any(result["status"] == "success" for result in results)
+    return {"status": "error", "results": results}, 207 if sent or len(codes) > 1 else codes.pop()
+
+
+@app.route("/trigger_batch", methods=["POST"])
+def trigger_batch():
+    data = request.get_json(silent=True)
+    target_server, items, stop_on_error, error = parse_trigger_batch(data)
+    if error:
+        return jsonify(error[0]), error[1]
+
+    user = data.get("user", "user1")
+    results = []
+    for index, (macro, delay) in enumerate(items):
+        if index and delay:
+            time.sleep(delay)
+        try:
+            elapsed = send_trigger(target_server, macro, user)
+            results.append({"macro": macro, "status": "success", "elapsed_ms": round(elapsed * 1000, 1)})
+        except requests.exceptions.RequestException as e:
+            log.error("Error triggering macro '%s': %s", macro, e, extra={"macro": macro})
+            results.append(batch_failure(macro, e, trigger_error_status(e)))
+            if stop_on_error:
+                results.extend({"macro": m, "status": "skipped"} for m, _ in items[index + 1:])
+                break
+    payload, status = batch_response(results)
+    return jsonify(payload), status
     
+# Loadout sync (opt-in, needs firmware with /system/loadout and /slot/<n>):
+# a profile is compiled into a slot table of (macro, input code) and pushed to
+# the user's device in one request that carries only the slots that changed.
+# Once the device's status `macros` confirm every entry, triggers for those
+# macros are sent as /slot/<n>; anything unconfirmed falls back to /<macro>.
+LOADOUT_SYNC = os.environ.get("MACROLINK_LOADOUT_SYNC", "0") == "1"
+LOADOUT_TIMEOUT = 2
+
+LoadoutSlot = namedtuple("LoadoutSlot", "key sequence")
+
+
+def compile_loadout(macros):
+    # Returns (slot table, macros that have no input code)
+    table, skipped = [], []
+    for name in macros:
+        key = resolve_macro(name) if isinstance(name, str) else None
+        info = MACRO_CATALOG.get(key)
+        if info is None or not info.sequence:
+            skipped.append(name)
+        elif LoadoutSlot(key, info.sequence) not in table:
+            table.append(LoadoutSlot(key, info.sequence))
+    return tuple(table), skipped
+
+
+def loadout_missing(table, data):
+    # Slots the device's status `macros` doesn't report with the expected input code
+    reported = {name.strip().lower(): str(code).upper() for name, code in (data.get("macros") or {}).items()}
+    return [slot.key for slot in table if reported.get(slot.key.lower()) != slot.sequence]
+
+
+class DeviceLoadout:
+    def __init__(self):
+        self.table = None  # slot table the device acknowledged, None when unknown
+        self.profile = None
+        self.slot_index = {}  # macro key -> slot, only while verified
+        self.missing = []
+        self.synced_at = None
+        self.uptime = None  # last reported uptime; going backwards means the device rebooted
+        self.lock = Lock()  # one sync at a time per device
+
+
+class LoadoutSync:
+    def __init__(self):
+        self._devices = {}  # base_url -> DeviceLoadout
+        self._lock = Lock()
+        self.version = 0  # bumped whenever a snapshot() would change, for the status ETag
+
+    def trigger_path(self, base_url, macro):
+        state = self._devices.get(base_url)
+        slot = state.slot_index.get(macro) if state else None
+        return macro if slot is None else f"slot/{slot}"
+
+    def sync(self, base_url, user, profile, macros):
+        table, skipped = compile_loadout(macros)
+        with self._lock:
+            state = self._devices.setdefault(base_url, DeviceLoadout())
+        with state.lock:
+            previous = state.table if state.slot_index else None
+            changes = {str(i): list(slot) for i, slot in enumerate(table)
+                       if previous is None or i >= len(previous) or previous[i] != slot}
+            result = {"profile": profile, "slots": len(table), "pushed": len(changes), "skipped": skipped}
+            if previous is not None and not changes and len(previous) == len(table):
+                state.profile = profile
+                self.version += 1
+                return dict(result, status="unchanged")
+
+            if not breaker_for(base_url).allow():
+                raise DeviceUnavailable("Device unavailable (circuit open)")
+            # One slot covers the push and the status read that verifies it; a busy device
+            # raises DeviceBusy here, before the current table is touched
+            limiter = limiter_for(base_url)
+            limiter.acquire(DeviceLimiter.CONTROL)
+            state.slot_index = {}
+            try:
+                device_pool.post(base_url, "/system/loadout", timeout=LOADOUT_TIMEOUT,
+                                 json={"size": len(table), "slots": changes}).raise_for_status()
+                data = device_pool.get(base_url, "/system/status.json", timeout=LOADOUT_TIMEOUT, retry=True).json()
+            except (requests.exceptions.RequestException, ValueError):
+                state.table = None  # unknown device contents: push everything next time
+                raise
+            finally:
+                self.version += 1
+                limiter.release()
+            state.table = table
+            state.profile = profile
+            state.synced_at = time.time()
+            state.uptime = data.get("uptime")
+            state.missing = loadout_missing(table, data)
+            if not state.missing:
+                state.slot_index = {slot.key: i for i, slot in enumerate(table)}
+            self.version += 1
+        status = "unverified" if state.missing else "synced"
+        events.publish("loadout", dict(result, device=device_name(base_url), user=user, status=status,
+                                       missing=state.missing))
+        return dict(result, status=status, missing=state.missing)
+
+    def check(self, base_url, data):
+        # Called with every status poll: a device that lost its table (reboot) stops getting slot triggers
+        state = self._devices.get(base_url)
+        if state is None:
+            return
+        # A sync in progress holds the lock across its device requests and verifies the
+        # result itself, so this poll skips the check rather than wait for it
+        if not state.lock.acquire(blocking=False):
+            return
+        try:
+            if not state.slot_index or state.table is None:
+                return
+            uptime, last_uptime = data.get("uptime"), state.uptime
+            state.uptime = uptime
+            rebooted = (isinstance(uptime, (int, float)) and isinstance(last_uptime, (int, float))
+                        and uptime < last_uptime)
+            missing = state.missing = loadout_missing(state.table, data)
+            if rebooted or missing:
+                log.warning("%s %s, triggering by name until the loadout is synced again", device_name(base_url),
+                            "rebooted" if rebooted else "lost " + ", ".join(missing),
+                            extra={"device": device_name(base_url)})
+                state.slot_index = {}
+                state.table = None
+                self.version += 1
+        finally:
+            state.lock.release()
+
+    def snapshot(self, base_url):
+        state = self._devices.get(base_url)
+        if state is None:
+            return None
+        return {"profile": state.profile, "slots": [slot.key for slot in state.table or ()],
+                "verified": bool(state.slot_index), "missing": state.missing, "synced_at": state.synced_at}
+
+
+loadouts = LoadoutSync()
+
+
+@app.route('/sync_loadout', methods=['POST'])
+def sync_loadout():
+    if not LOADOUT_SYNC:
+        return jsonify({'error': 'Loadout sync is disabled'}), 404
+    data = request.get_json(silent=True) or {}
+    user = data.get('user')
+    profile = normalize_name(data.get('profile') or '')
+    target_server = device_registry.target(user) if user else None
+    if not target_server or not profile:
+        return jsonify({'error': 'Missing or invalid user or profile'}), 400
+
+    with profile_store.lock(user, shared=True):
+        macros = profile_store.get(user, profile)
+    if not macros:
+        return jsonify({'error': 'Profile not found'}), 404
+
+    try:
+        return jsonify(loadouts.sync(target_server, user, profile, macros))
+    except DeviceBusy as e:
+        return busy_response(e, {})
+    except DeviceUnavailable as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+    except (requests.exceptions.RequestException, ValueError) as e:
+        log.error("Loadout sync to %s failed: %s", device_name(target_server), e,
+                  extra={"device": device_name(target_server)})
+        return jsonify({'status': 'error', 'message': str(e)}), 502
+
+
 @app.route('/save_profile', methods=['POST'])
 def save_profile():
     data = request.get_json()
@@ -413,23 +2513,32 @@ def save_profile():
 
     if not user or not isinstance(macros, list):
         return jsonify({'error': 'Missing user or macros'}), 400
+    unknown = unknown_macros(macros)
+    if unknown:
+        return jsonify({'error': 'Unknown macro', 'unknown': unknown}), 400
 
-    with profile_lock:
-        profiles = load_profiles()
-        profiles.setdefault(user, {})[profile] = macros
-        save_profiles(profiles)
+    with profile_store.lock(user):
+        profile_store.save(user, profile, macros)
+    events.publish("profiles", {"op": "save", "user": user, "profile": profile})
 
     return jsonify({'status': 'saved', 'user': user, 'profile': profile})
 
 
+all_profiles_cache = {}  # serialized /all_profiles body for the current store version
+
+
 @app.route('/all_profiles')
 def all_profiles():
     try:
-        with profile_lock:
-            profiles = load_profiles()
-            return jsonify(profiles)
+        with profile_store.lock(shared=True):
+            version = profile_store.version
+            cached = all_profiles_cache.get('entry')
+            if cached is None or cached[0] != version:
+                body = app.json.dumps(profile_store.all()).encode()
+                cached = all_profiles_cache['entry'] = (version, body, json_etag(body, f"p-{INSTANCE_ID}-{version}"))
+        return conditional_json(body=cached[1], etag=cached[2])
     except Exception as e:
-        print(f"[ERROR] all_profiles failed: {e}")
+        log.error("all_profiles failed: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/list_profiles')
@@ -438,11 +2547,11 @@ def list_profiles():
     if not user:
         return jsonify({'error': 'Missing user'}), 400
     try:
-        with profile_lock:
-            profiles = load_profiles()
-            return jsonify({'profiles': list(profiles.get(user, {}).keys())})
+        with profile_store.lock(user, shared=True):
+            names = profile_store.names(user)
+        return conditional_json({'profiles': names})
     except Exception as e:
-        print(f"[ERROR] list_profiles failed: {e}")
+        log.error("list_profiles failed: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 
@@ -455,23 +2564,139 @@ def get_profile():
         # Decode + normalize
         profile = urllib.parse.unquote_plus(profile).lower()
 
-        # Simulated: load your profiles (dict or db)
-        all_profiles = load_user_profiles(user)  # returns dict like { "major defense": {...} }
-
-        # Normalize keys
-        normalized_profiles = {k.lower(): v for k, v in all_profiles.items()}
-        data = normalized_profiles.get(profile)
+        with profile_store.lock(user, shared=True):
+            data = profile_store.get(user, profile)
 
         if not data:
             return jsonify({"error": "Profile not found"}), 404
 
-        return jsonify({"macros": data})
+        return conditional_json({"macros": data})
 
     except Exception as e:
-        print("get_profile error:", e)
+        log.error("get_profile failed: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
+# Scoped profile API. Pages are ordered by lowercase name; the cursor is the
+# last name of the previous page, so saves and deletes between requests never
+# shift later pages (no duplicates, no gaps for profiles that still exist).
+PROFILE_PAGE_SIZE = 100
+PROFILE_PAGE_MAX = 1000
+PROFILE_IMPORT_BATCH = 500
+PROFILE_IMPORT_MAX_ERRORS = 20
+
+
+def encode_cursor(name_key):
+    return base64.urlsafe_b64encode(name_key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    return base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True).decode()
+
+
+@app.route('/profiles/<user>')
+def user_profiles(user):
+    try:
+        limit = int(request.args.get('limit', PROFILE_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or cursor'}), 400
+    if not 1 <= limit <= PROFILE_PAGE_MAX:
+        return jsonify({'error': f'limit must be between 1 and {PROFILE_PAGE_MAX}'}), 400
+
+    with profile_store.lock(user, shared=True):
+        # One extra row tells us whether there is a next page
+        rows = profile_store.page(user, after, limit + 1)
+    next_cursor = encode_cursor(rows[limit - 1][0].lower()) if len(rows) > limit else None
+    return conditional_json({
+        'user': user,
+        'profiles': [{'name': name, 'macros': macros} for name, macros in rows[:limit]],
+        'next_cursor': next_cursor,
+    })
+
+
+# path: a name containing "/" (sent as %2F, decoded before routing) must not fall through to catch_all
+@app.route('/profiles/<user>/<path:profile>')
+def user_profile(user, profile):
+    profile = normalize_name(profile)
+    with profile_store.lock(user, shared=True):
+        macros = profile_store.get(user, profile)
+    if macros is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return conditional_json({'user': user, 'name': profile, 'macros': macros})
+
+
+@app.route('/profiles/export.ndjson')
+def export_profiles():
+    # One {"user", "profile", "macros"} object per line, streamed as it is read
+    user = request.args.get('user') or None
+
+    def stream():
+        for owner, name, macros in profile_store.export(user):
+            yield json.dumps({'user': owner, 'profile': name, 'macros': macros}) + "\n"
+
+    filename = f"profiles-{user}.ndjson" if user else "profiles.ndjson"
+    return Response(stream(), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+def parse_import_line(line):
+    entry = json.loads(line)
+    if not isinstance(entry, dict):
+        raise ValueError("expected an object")
+    user, profile, macros = entry.get('user'), entry.get('profile'), entry.get('macros')
+    if not isinstance(user, str) or not user or not isinstance(profile, str) or not normalize_name(profile):
+        raise ValueError("missing user or profile")
+    if not isinstance(macros, list) or not all(isinstance(m, str) for m in macros):
+        raise ValueError("macros must be a list of strings")
+    unknown = unknown_macros(macros)
+    if unknown:
+        raise ValueError("unknown macros: " + ", ".join(unknown))
+    return user, normalize_name(profile), macros
+
+
+@app.route('/profiles/import', methods=['POST'])
+def import_profiles():
+    # Reads the body line by line and saves in batches, so memory stays flat
+    # however many profiles are sent. Bad lines are reported and skipped.
+    imported, failed, errors, batch = 0, 0, [], []
+
+    def flush():
+        # Under each user's own lock, so an import is serialised with that user's
+        # save/rename/delete on every backend (lock() without a user is a read lock on SQLite)
+        nonlocal imported
+        by_user = {}
+        for entry in batch:
+            by_user.setdefault(entry[0], []).append(entry)
+        for user, entries in by_user.items():
+            with profile_store.lock(user):
+                imported += profile_store.save_many(entries)
+        batch.clear()
+
+    for number, line in enumerate(request.stream, 1):
+        if not line.strip():
+            continue
+        try:
+            batch.append(parse_import_line(line))
+        except ValueError as e:
+            failed += 1
+            if len(errors) < PROFILE_IMPORT_MAX_ERRORS:
+                errors.append({'line': number, 'error': str(e)})
+            continue
+        if len(batch) >= PROFILE_IMPORT_BATCH:
+            flush()
+    if batch:
+        flush()
+
+    if imported:
+        events.publish("profiles", {"op": "import", "count": imported})
+    log.info("profile import: %d saved, %d rejected", imported, failed,
+             extra={"imported": imported, "rejected": failed})
+    status = 400 if failed and not imported else 200
+    return jsonify({'status': 'imported', 'imported': imported, 'rejected': failed, 'errors': errors}), status
+
+
 @app.route('/delete_profile', methods=['POST'])
 def delete_profile():
     data = request.get_json()
@@ -481,11 +2706,9 @@ def delete_profile():
     if not user or not profile:
         return jsonify({'error': 'Missing user or profile'}), 400
 
-    with profile_lock:
-        profiles = load_profiles()
-        if user in profiles and profile in profiles[user]:
-            del profiles[user][profile]
-            save_profiles(profiles)
+    with profile_store.lock(user):
+        if profile_store.delete(user, profile):
+            events.publish("profiles", {"op": "delete", "user": user, "profile": profile})
             return jsonify({'status': 'deleted'})
         return jsonify({'error': 'Profile not found'}), 404
     
@@ -499,33 +2722,77 @@ def rename_profile():
     if not user or not old_name or not new_name:
         return jsonify({'error': 'Missing parameters'}), 400
 
-    with profile_lock:
-        profiles = load_profiles()
-        user_profiles = profiles.get(user, {})
-        if old_name not in user_profiles:
+    with profile_store.lock(user):
+        if not profile_store.exists(user, old_name):
             return jsonify({'error': 'Old profile not found'}), 404
-        if new_name in user_profiles:
+        if profile_store.exists(user, new_name):
             return jsonify({'error': 'New profile already exists'}), 400
 
-        user_profiles[new_name] = user_profiles.pop(old_name)
-        save_profiles(profiles)
+        profile_store.rename(user, old_name, new_name)
+        events.publish("profiles", {"op": "rename", "user": user, "from": old_name, "to": new_name})
         return jsonify({'status': 'renamed', 'from': old_name, 'to': new_name})
     
-# @app.route('/macros.json')
-# def serve_macros():
-#     return send_from_directory("static/json", "macros.json")
+MACRO_CATALOG_MAX_AGE = 86400
+
+macro_catalog_body = app.json.dumps({
+    key: {"name": info.name, "image": info.image, "category": info.category,
+          "border": info.border, "static": info.static, "alias": info.alias, "sequence": info.sequence}
+    for key, info in MACRO_CATALOG.items()
+}).encode()
+macro_catalog_etag = json_etag(macro_catalog_body)
+
+
+@app.route('/macros.json')
+def serve_macros():
+    response = app.response_class(macro_catalog_body, mimetype='application/json')
+    response.set_etag(macro_catalog_etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = MACRO_CATALOG_MAX_AGE
+    return response.make_conditional(request)
+
+@app.route('/debug/logs')
+def debug_logs():
+    # ?level=WARNING&request_id=...&limit=100, newest last
+    level = logging.getLevelName(request.args.get('level', 'DEBUG').upper())
+    if not isinstance(level, int):
+        return jsonify({'error': 'Unknown level'}), 400
+    request_id = request.args.get('request_id')
+    limit = request.args.get('limit', LOG_RING_SIZE, type=int)
+    records = [record for record in list(log_ring.records)
+               if logging.getLevelName(record["level"]) >= level
+               and (request_id is None or record.get("request_id") == request_id)]
+    return jsonify({'records': records[-limit:] if limit > 0 else []})
+
+
+@app.route('/metrics')
+def metrics():
+    lines = []
+    for metric in metrics_registry:
+        lines += metric.render()
+    return app.response_class("\n".join(lines) + "\n", mimetype='text/plain; version=0.0.4')
 
 # Catch-all for Vue Router (must be LAST route)
 @app.route('/<path:path>')
 def catch_all(path):
-    print(f"[CATCH-ALL] Requested path: {path}")
-    file_path = os.path.join('dist', path)
-    print(f"[CATCH-ALL] Checking if exists: {file_path}")
-    if os.path.exists(file_path):
-        print(f"[CATCH-ALL] File exists, serving: {path}")
-        return send_from_directory('dist', path)
-    print(f"[CATCH-ALL] File not found, serving index.html")
-    return send_from_directory('dist', 'index.html')
+    entry = static_index.lookup(path)
+    if entry is not None:
+        return serve_static(entry)
+    return serve_index()
     
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8888)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="MacroLink backend")
+    parser.add_argument("--migrate-profiles", action="store_true",
+                        help=f"import {PROFILE_PATH} into the SQLite store at {PROFILE_DB_PATH} and exit")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8888)
+    args = parser.parse_args()
+
+    if args.migrate_profiles:
+        count, collisions = migrate_profiles()
+        print(f"Migrated {count} profiles into {PROFILE_DB_PATH}")
+        for user, name, kept in collisions:
+            print(f"Skipped {user}/{name!r}: same name as {kept!r}", file=sys.stderr)
+        if collisions:
+            sys.exit(1)
+    else:
+        app.run(host=args.host, port=args.port)
\ No newline at end of file
@@ -0,0 +1,402 @@
+"""Async serving mode for MacroLink.
+
+The device-facing endpoints (/trigger/<macro>, /trigger_batch,
+/dashboard/status.json and the /events stream) run as async handlers on a
+single event loop with a shared httpx client, so an in-flight trigger no
+longer holds an OS thread. Every other route is the regular Flask app, run on
+a pool of MACROLINK_ASGI_THREADS worker threads (default 32) so slow Flask
+requests (a device reboot, a loadout push) don't hold up the rest.
+
+    pip install -r requirements-async.txt
+    uvicorn asgi:app --host 0.0.0.0 --port 8888
+
+`python app.py` remains the simple, dependency-light way to run the backend.
+"""
+import asyncio, gzip, json, math, os, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import httpx # type: ignore
+from asgiref.sync import sync_to_async # type: ignore
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance # type: ignore
+
+import app as backend
+
+FLASK_THREADS = int(os.environ.get("MACROLINK_ASGI_THREADS", 32))
+
+
+class PooledWsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs run_wsgi_app with thread_sensitive=True, i.e. every Flask
+    # request on one shared thread. Run the same body on a real pool instead.
+    executor = ThreadPoolExecutor(max_workers=FLASK_THREADS, thread_name_prefix="flask")
+
+    async def run_wsgi_app(self, body):
+        run = WsgiToAsgiInstance.__dict__["run_wsgi_app"].func
+        await sync_to_async(run, thread_sensitive=False, executor=self.executor)(self, body)
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await PooledWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+flask_app = PooledWsgiToAsgi(backend.app)
+
+
+class AsyncDevicePool:
+    # Async counterpart of app.DevicePool: one keep-alive client per device
+    def __init__(self, pool_size=backend.PICO_POOL_SIZE, keepalive=backend.PICO_KEEPALIVE,
+                 idle_timeout=backend.PICO_IDLE_TIMEOUT):
+        self.limits = httpx.Limits(max_connections=pool_size,
+                                   max_keepalive_connections=pool_size if keepalive else 0,
+                                   keepalive_expiry=idle_timeout)
+        self._clients = {}
+
+    def client(self, base_url):
+        client = self._clients.get(base_url)
+        if client is None:
+            client = self._clients[base_url] = httpx.AsyncClient(base_url=base_url, limits=self.limits)
+        return client
+
+    async def get(self, base_url, path, timeout, retry=False):
+        # retry=True only for status reads; see app.DevicePool.request
+        url = f"/{path.lstrip('/')}"
+        request_id = backend.request_id_var.get()
+        headers = {"X-Request-ID": request_id} if request_id else None
+        try:
+            return await self.client(base_url).get(url, timeout=timeout, headers=headers)
+        except httpx.RemoteProtocolError:
+            if not retry:
+                raise
+            # Stale keep-alive socket (device rebooted or closed it): reconnect once
+            return await self.client(base_url).get(url, timeout=timeout, headers=headers)
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+device_pool = AsyncDevicePool()
+
+
+def httpx_error_kind(e):
+    if isinstance(e, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(e, httpx.TransportError):
+        return "connection"
+    if isinstance(e, httpx.HTTPStatusError):
+        return "http"
+    return "other"
+
+
+class DeviceUnavailable(httpx.HTTPError):
+    pass
+
+
+LIMITER_WAIT_STEP = 0.01
+
+
+class DeviceBusy(DeviceUnavailable):
+    def __init__(self, busy):
+        super().__init__(str(busy))
+        self.reason = busy.reason
+        self.status = busy.status
+        self.retry_after = busy.retry_after
+
+
+async def acquire(limiter, priority):
+    # Shares app.py's per-device limiter; a waiting request polls it from the
+    # event loop instead of blocking a thread on the limiter's condition
+    if limiter.try_acquire(priority):
+        return
+    if limiter.enqueue(priority):
+        deadline = time.monotonic() + limiter.max_wait[priority]
+        try:
+            while time.monotonic() < deadline:
+                await asyncio.sleep(LIMITER_WAIT_STEP)
+                if limiter.try_acquire(priority):
+                    return
+        finally:
+            limiter.dequeue(priority)
+    raise DeviceBusy(limiter.reject(priority))
+
+
+async def send_trigger(target_server, macro, user):
+    if not backend.breaker_for(target_server).allow():
+        backend.upstream_errors.inc(backend.device_name(target_server), "trigger", "circuit_open")
+        raise DeviceUnavailable("Device unavailable (circuit open)")
+    limiter = backend.limiter_for(target_server)
+    try:
+        await acquire(limiter, backend.DeviceLimiter.TRIGGER)
+    except DeviceBusy as e:
+        backend.upstream_errors.inc(backend.device_name(target_server), "trigger", e.reason)
+        raise
+    start = time.perf_counter()
+    try:
+        response = await device_pool.get(target_server, backend.loadouts.trigger_path(target_server, macro),
+                                         timeout=backend.TRIGGER_TIMEOUT)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        error_kind = httpx_error_kind(e)
+        backend.record_device_result(target_server, error_kind)
+        backend.record_trigger(user, target_server, macro, time.perf_counter() - start, error_kind)
+        raise
+    finally:
+        limiter.release()
+    elapsed = time.perf_counter() - start
+    backend.record_device_result(target_server)
+    backend.record_trigger(user, target_server, macro, elapsed)
+    return elapsed
+
+
+class AsyncStatusRefresher:
+    # Feeds app.status_poller from the event loop instead of its polling thread
+    def __init__(self, poller):
+        self.poller = poller
+        self._inflight = None
+
+    async def _poll_device(self, pico_id, pico_url):
+        if not backend.breaker_for(pico_url).allow():
+            return None, "Device unavailable (circuit open)", time.monotonic()
+        limiter = backend.limiter_for(pico_url)
+        if not limiter.try_acquire(backend.DeviceLimiter.STATUS):
+            return self.poller.skipped(pico_id)
+        start = time.perf_counter()
+        try:
+            r = await device_pool.get(pico_url, "/system/status.json", timeout=self.poller.timeout, retry=True)
+            data = r.json()
+        except Exception as e:
+            error_kind = httpx_error_kind(e)
+            backend.record_device_result(pico_url, error_kind)
+            backend.record_status_poll(pico_id, time.perf_counter() - start, error_kind)
+            return None, str(e) or type(e).__name__, time.monotonic()
+        finally:
+            limiter.release()
+        backend.record_device_result(pico_url)
+        backend.record_status_poll(pico_id, time.perf_counter() - start)
+        return data, None, time.monotonic()
+
+    async def _poll_with_deadline(self, pico_id, pico_url):
+        try:
+            return await asyncio.wait_for(self._poll_device(pico_id, pico_url), self.poller.deadline)
+        except asyncio.TimeoutError:
+            return None, "Status poll timed out", time.monotonic()
+
+    async def _poll(self):
+        start = time.perf_counter()
+        devices = dict(self.poller.devices)
+        results = await asyncio.gather(*(self._poll_with_deadline(pico_id, url) for pico_id, url in devices.items()))
+        self.poller.store(dict(zip(devices, results)))
+        backend.status_cycle_latency.observe(time.perf_counter() - start)
+
+    async def refresh(self):
+        # Single flight: concurrent callers await the same poll
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._poll())
+        await asyncio.shield(self._inflight)
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                backend.log.error("Status poll failed: %s", e)
+            await asyncio.sleep(self.poller.interval)
+
+
+status_refresher = AsyncStatusRefresher(backend.status_poller)
+
+
+async def send_json(send, payload, status=200, headers=None, request_headers=None):
+    body = json.dumps(payload).encode()
+    response_headers = [(b"content-type", b"application/json"), (b"access-control-allow-origin", b"*")]
+    response_headers += headers or []
+    accept_encoding = (request_headers or {}).get(b"accept-encoding", b"")
+    if status == 200 and len(body) >= backend.JSON_COMPRESS_MIN_SIZE and b"gzip" in accept_encoding:
+        body = gzip.compress(body, compresslevel=5)
+        response_headers += [(b"content-encoding", b"gzip"), (b"vary", b"Accept-Encoding")]
+    response_headers.append((b"content-length", str(len(body)).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": response_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def combined_status(scope, send, request_headers):
+    if backend.status_poller.is_stale():
+        await status_refresher.refresh()
+    etag = f'W/"{backend.status_etag()}"'.encode()
+    cache_headers = [(b"etag", etag), (b"cache-control", b"no-cache")]
+    if etag in request_headers.get(b"if-none-match", b""):
+        await send({"type": "http.response.start", "status": 304, "headers": cache_headers})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    await send_json(send, backend.status_poller.render(), headers=cache_headers, request_headers=request_headers)
+
+
+class AsyncEventSubscriber:
+    # app.EventSubscriber for the event loop; deliver() may be called from any thread
+    def __init__(self, size=backend.EVENT_QUEUE_SIZE):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.size = size
+        self.dropped = False
+
+    def deliver(self, message):
+        if self.queue.qsize() >= self.size:
+            self.dropped = True
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+            return False
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, message)
+        return True
+
+
+async def event_stream(scope, receive, send):
+    # Served here rather than by Flask: the WSGI adapter runs Flask on one shared thread
+    subscriber = AsyncEventSubscriber()
+    backend.events.subscribe(subscriber)
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        subscriber.queue.put_nowait(None)
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"), (b"access-control-allow-origin", b"*")]})
+        if backend.status_poller.is_stale():
+            await status_refresher.refresh()
+        message = backend.format_event("snapshot", backend.status_poller.render())
+        while message is not None:
+            await send({"type": "http.response.body", "body": message.encode(), "more_body": True})
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), backend.EVENT_KEEPALIVE)
+            except asyncio.TimeoutError:
+                message = ": keepalive\n\n"
+    finally:
+        backend.events.unsubscribe(subscriber)
+        watcher.cancel()
+
+
+async def trigger_macro(scope, send, macro):
+    query = parse_qs(scope.get("query_string", b"").decode())
+    selected_user = query.get("user", ["user1"])[0]
+    target_server = backend.device_registry.target(selected_user)
+
+    if not target_server:
+        return await send_json(send, {"error": "Invalid user"}, 400)
+
+    macro_key = backend.resolve_macro(macro)
+    if macro_key is None:
+        return await send_json(send, {"status": "error", "macro": macro, "message": "Unknown macro"}, 404)
+    macro = macro_key
+
+    backend.log.info("Triggering macro '%s' for user '%s' → %s", macro, selected_user, target_server,
+                     extra={"macro": macro, "user": selected_user, "device": backend.device_name(target_server)})
+    try:
+        await send_trigger(target_server, macro, selected_user)
+        return await send_json(send, {"status": "success", "macro": macro})
+    except DeviceBusy as e:
+        return await send_json(send, {"status": "error", "macro": macro, "message": str(e),
+                                      "retry_after": e.retry_after}, e.status,
+                               headers=[(b"retry-after", str(max(1, math.ceil(e.retry_after))).encode())])
+    except DeviceUnavailable as e:
+        return await send_json(send, {"status": "error", "macro": macro, "message": str(e)}, 503)
+    except httpx.HTTPError as e:
+        backend.log.error("Error triggering macro '%s': %s", macro, e, extra={"macro": macro})
+        return await send_json(send, {"status": "error", "macro": macro, "message": str(e) or type(e).__name__}, 500)
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def trigger_batch(scope, receive, send):
+    try:
+        data = json.loads(await read_body(receive) or b"null")
+    except ValueError:
+        data = None
+    target_server, items, stop_on_error, error = backend.parse_trigger_batch(data)
+    if error:
+        return await send_json(send, error[0], error[1])
+
+    user = data.get("user", "user1")
+    results = []
+    for index, (macro, delay) in enumerate(items):
+        if index and delay:
+            await asyncio.sleep(delay)
+        try:
+            elapsed = await send_trigger(target_server, macro, user)
+            results.append({"macro": macro, "status": "success", "elapsed_ms": round(elapsed * 1000, 1)})
+        except httpx.HTTPError as e:
+            backend.log.error("Error triggering macro '%s': %s", macro, e, extra={"macro": macro})
+            code = e.status if isinstance(e, DeviceBusy) else 503 if isinstance(e, DeviceUnavailable) else 500
+            results.append(backend.batch_failure(macro, e, code))
+            if stop_on_error:
+                results.extend({"macro": m, "status": "skipped"} for m, _ in items[index + 1:])
+                break
+    payload, status = backend.batch_response(results)
+    await send_json(send, payload, status)
+
+
+async def lifespan(receive, send):
+    poll_task = None
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            poll_task = asyncio.ensure_future(status_refresher.run())
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if poll_task:
+                poll_task.cancel()
+            await device_pool.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+def logged(scope, send, route):
+    # Same request id, per-route filtering and access record as the Flask hooks in app.py
+    request_id = dict(scope["headers"]).get(b"x-request-id", b"").decode() or uuid.uuid4().hex[:12]
+    backend.request_id_var.set(request_id)
+    backend.route_var.set(route)
+    started = time.perf_counter()
+
+    async def logged_send(message):
+        if message["type"] == "http.response.start":
+            message = dict(message, headers=list(message.get("headers", [])) + [(b"x-request-id", request_id.encode())])
+            backend.log.info("%s %s %s", scope["method"], scope["path"], message["status"],
+                             extra={"status": message["status"],
+                                    "duration_ms": round((time.perf_counter() - started) * 1000, 2)})
+        await send(message)
+    return logged_send
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+
+    if scope["type"] == "http" and scope["method"] == "GET":
+        path = scope["path"]
+        request_headers = dict(scope["headers"])
+        if path == "/dashboard/status.json":
+            return await combined_status(scope, logged(scope, send, "combined_status"), request_headers)
+        if path == "/events":
+            return await event_stream(scope, receive, logged(scope, send, "event_stream"))
+        if path.startswith("/trigger/") and "/" not in path[len("/trigger/"):]:
+            return await trigger_macro(scope, logged(scope, send, "trigger_macro"), path[len("/trigger/"):])
+
+    if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/trigger_batch":
+        return await trigger_batch(scope, receive, logged(scope, send, "trigger_batch"))
+
+    await flask_app(scope, receive, send)
+
+
+if __name__ == "__main__":
+    import uvicorn # type: ignore
+    uvicorn.run(app, host="0.0.0.0", port=8888)
@@ -0,0 +1,102 @@
+"""The macro catalog, shared by app.py and tools/fake_pico.py.
+
+macroData.js is the source of truth for macros. `npm run build` writes its
+objects to dist/macro-data.json, which is compiled into an immutable catalog:
+key -> display name, image, category, alias, input code. A source checkout
+without a build falls back to parsing macroData.js itself; with neither file
+loading fails. Importing this module has no side effects.
+"""
+import json, logging, os, re
+from collections import namedtuple
+from types import MappingProxyType
+
+log = logging.getLogger("macrolink")
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MACRO_DATA_PATH = os.path.join(ROOT, 'src', 'data', 'macroData.js')
+MACRO_DATA_JSON_PATH = os.environ.get("MACROLINK_MACRO_DATA", os.path.join(ROOT, 'dist', 'macro-data.json'))
+
+# Stratagem categories as colour-coded in game (and by the MACRO_STYLES borders)
+MACRO_CATEGORIES = {
+    "red": "offensive",
+    "blue": "supply",
+    "green": "defensive",
+    "yellow": "mission",
+}
+
+MacroInfo = namedtuple("MacroInfo", "key name image category border static alias sequence")
+
+MACRO_SEQUENCE = re.compile(r"^[WASD]+$")
+
+JS_OBJECT_START = re.compile(r"^export const (\w+) = \{\s*$")
+JS_OBJECT_ENTRY = re.compile(r"""^\s*(?:'([^']+)'|"([^"]+)"|([\w$]+))\s*:\s*(.+?),?\s*$""")
+JS_STRING = re.compile(r"""^'((?:[^'\\]|\\.)*)'$|^"((?:[^"\\]|\\.)*)"$""")
+
+
+def parse_js_entry(line):
+    match = JS_OBJECT_ENTRY.match(line)
+    if not match:
+        raise ValueError(f"Unsupported entry in macroData.js: {line.strip()}")
+    return match.group(1) or match.group(2) or match.group(3), parse_js_value(match.group(4))
+
+
+def parse_js_value(raw):
+    raw = raw.strip()
+    if raw.startswith('{') and raw.endswith('}'):
+        return dict(parse_js_entry(part) for part in raw[1:-1].split(',') if part.strip())
+    match = JS_STRING.match(raw)
+    if not match:
+        raise ValueError(f"Unsupported value in macroData.js: {raw}")
+    return match.group(1) if match.group(1) is not None else match.group(2)
+
+
+def parse_macro_data(path):
+    # Reads the flat `export const NAME = { key: value, ... }` objects of macroData.js
+    objects = {}
+    current = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('//', 1)[0].rstrip()
+            if current is None:
+                match = JS_OBJECT_START.match(line)
+                if match:
+                    current = objects[match.group(1)] = {}
+            elif line.strip() == '}':
+                current = None
+            elif line.strip():
+                key, value = parse_js_entry(line)
+                current[key] = value
+    return objects
+
+
+def load_macro_data(json_path=MACRO_DATA_JSON_PATH, source_path=MACRO_DATA_PATH):
+    if os.path.exists(json_path):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    if os.path.exists(source_path):
+        log.warning("%s not found (frontend not built), parsing %s", json_path, source_path)
+        return parse_macro_data(source_path)
+    raise RuntimeError(f"No macro catalog: run `npm run build` to create {json_path}")
+
+
+def compile_macro_catalog(objects):
+    images = objects.get("MACRO_IMAGES", {})
+    styles = objects.get("MACRO_STYLES", {})
+    sequences = objects.get("MACRO_SEQUENCES", {})
+    catalog = {}
+    for source, static in (("STATIC_MACROS", True), ("DYNAMIC_MACROS", False)):
+        for key, name in objects.get(source, {}).items():
+            border = styles.get(key, {}).get("border")
+            sequence = sequences.get(key, "").upper()
+            if sequence and not MACRO_SEQUENCE.match(sequence):
+                raise ValueError(f"Invalid input code for {key}: {sequence}")
+            catalog[key] = MacroInfo(key, name, images.get(key), MACRO_CATEGORIES.get(border),
+                                     border, static, key.lower(), sequence or None)
+    return MappingProxyType(catalog)
+
+
+def load_macro_catalog(json_path=MACRO_DATA_JSON_PATH, source_path=MACRO_DATA_PATH):
+    catalog = compile_macro_catalog(load_macro_data(json_path, source_path))
+    if not catalog:
+        raise RuntimeError("The macro catalog is empty")
+    return catalog
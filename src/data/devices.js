@@ -0,0 +1,26 @@
+// Display styles for devices served by /devices.json. Tailwind only keeps class
+// names it can find in the source, so each colour is spelled out in full;
+// devices with other names get the neutral style.
+const BUTTON = 'text-black px-4 py-2 rounded-md shadow-sm shadow-black/50'
+
+export const DEVICE_STYLES = {
+  green: { button: `bg-green-500 ${BUTTON}`, menu: 'border-green-500/50 text-green-500 bg-neutral-800' },
+  blue: { button: `bg-blue-500 ${BUTTON}`, menu: 'border-blue-500/50 text-blue-500 bg-neutral-800' },
+  red: { button: `bg-red-500 ${BUTTON}`, menu: 'border-red-500/50 text-red-500 bg-neutral-800' },
+  yellow: { button: `bg-yellow-400 ${BUTTON}`, menu: 'border-yellow-400/50 text-yellow-400 bg-neutral-800' },
+  purple: { button: `bg-purple-500 ${BUTTON}`, menu: 'border-purple-500/50 text-purple-500 bg-neutral-800' },
+  orange: { button: `bg-orange-500 ${BUTTON}`, menu: 'border-orange-500/50 text-orange-500 bg-neutral-800' },
+}
+
+export const DEFAULT_DEVICE_STYLE = {
+  button: `bg-neutral-300 ${BUTTON}`,
+  menu: 'bg-neutral-800 hover:bg-neutral-600 text-yellow-300 border-neutral-700',
+}
+
+export function deviceStyle(name) {
+  return DEVICE_STYLES[name] || DEFAULT_DEVICE_STYLE
+}
+
+export function deviceLabel(name) {
+  return `Helldiver ${name.charAt(0).toUpperCase()}${name.slice(1)}`
+}
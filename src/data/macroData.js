@@ -1,5 +1,10 @@
-// Dynamic Macros from app.py
-// Whenever new macros are added, update app.py
+// Source of truth for macros: app.py compiles this file into its macro catalog
+// at startup (served as /macros.json), so new macros only need adding here
+export const STATIC_MACROS = {
+  Reinforce: 'Reinforce',
+  Resupply: 'Resupply',
+}
+
 export const DYNAMIC_MACROS = {
   Orbital_Precision_Strike: 'Orbital Precision Strike',
   Orbital_Gatling_Barrage: 'Orbital Gatling Barrage',
@@ -174,6 +179,8 @@ export const MACRO_IMAGES = {
   'S-11_Speargun': 'Speargun.webp',
   'EAT-700_Expendable_Napalm': 'Expendable_Napalm.webp',
   'MS-11_Solo_Silo': 'Solo_Silo.webp',
+  Reinforce: 'redeploy.webp',
+  Resupply: 'resupply.webp',
 }
 
 export const MACRO_STYLES = {
@@ -268,6 +275,98 @@ export const MACRO_STYLES = {
   'MS-11_Solo_Silo': { border: 'blue' },
 }
 
+// Stratagem input codes (W = up, A = left, S = down, D = right). The backend
+// compiles loadouts from these when it pushes them to a device
+export const MACRO_SEQUENCES = {
+  Reinforce: 'WSDAW',
+  Resupply: 'SSWD',
+  Orbital_Precision_Strike: 'DDW',
+  Orbital_Gatling_Barrage: 'DSAWW',
+  Orbital_Airburst_Strike: 'DDD',
+  Orbital_Napalm_Barrage: 'DDSADW',
+  Orbital_120MM_HE_Barrage: 'DDSADS',
+  Orbital_Walking_Barrage: 'DSDSDS',
+  Orbital_380MM_HE_Barrage: 'DSWWASS',
+  Orbital_Railcannon_Strike: 'DWSSD',
+  Orbital_Laser: 'DSWDS',
+  Orbital_EMS_Strike: 'DDAS',
+  Orbital_Gas_Strike: 'DDSD',
+  Orbital_Smoke_Strike: 'DDSW',
+  Eagle_500KG_Bomb: 'WDSSS',
+  Eagle_Strafing_Run: 'WDD',
+  Eagle_110MM_Rocket_Pods: 'WDWA',
+  Eagle_Airstrike: 'WDSD',
+  Eagle_Cluster_Bomb: 'WDSSD',
+  Eagle_Napalm_Airstrike: 'WDSW',
+  Eagle_Smoke_Strike: 'WDWS',
+  'CQC-1_One_True_Flag': 'SADDW',
+  'MG-43_Machine_Gun': 'SASWD',
+  'M-105_Stalwart': 'SASWWA',
+  'MG-206_Heavy_Machine_Gun': 'SAWSS',
+  'RS-422_Railgun': 'SDSWAD',
+  'APW-1_Anti-Materiel_Rifle': 'SADWS',
+  'GL-21_Grenade_Launcher': 'SAWAS',
+  'GL-52_De-Escalator': 'ADWAD',
+  'TX-14_Sterilizer': 'SAWSA',
+  'FLAM-40_Flamethrower': 'SAWSW',
+  'LAS-98_Laser_Cannon': 'SASWA',
+  'LAS-99_Quasar_Cannon': 'SSWAD',
+  'PLAS-45_Epoch': 'SAWAD',
+  'ARC-3_Arc_Thrower': 'SDSWAA',
+  'MLS-4X_Commando': 'SAWSD',
+  'S-11_Speargun': 'SDSAWD',
+  'EAT-17_Expendable_Anti-Tank': 'SSAWD',
+  'EAT-700_Expendable_Napalm': 'SSAWA',
+  'AC-8_Autocannon': 'SASWWD',
+  'RL-77_Airburst_Rocket_Launcher': 'SWWAD',
+  'FAF-14_Spear_Launcher': 'SSWSS',
+  'StA-X3_W.A.S.P._Launcher': 'SSWSD',
+  'GR-8_Recoilless_Rifle': 'SADDA',
+  'MS-11_Solo_Silo': 'SWDSS',
+  'LIFT-860_Hover_Pack': 'SWWSAD',
+  'LIFT-850_Jump_Pack': 'SWWSW',
+  'LIFT-182_Warp_Pack': 'SADSAD',
+  'SH-32_Shield_Generator_Pack': 'SWADAD',
+  'SH-51_Directional_Shield_Backpack': 'SWADWW',
+  'SH-20_Ballistic_Shield_Backpack': 'SASSWA',
+  'B-1_Supply_Pack': 'SASWWS',
+  'B-100_Portable_Hellbomb': 'SDWWW',
+  'AX-AR-23_Guard_Dog': 'SWAWDS',
+  'AX-LAS-5_Guard_Dog_Rover': 'SWAWDD',
+  'AX-TX-13_Guard_Dog_Dog_Breath': 'SWAWDW',
+  'AX_ARC-3_Guard_Dog_K9': 'SWAWDA',
+  'M-102_Fast_Recon_Vehicle': 'ASDSDSW',
+  'EXO-49_Emancipator_Exosuit': 'ASDWASW',
+  'EXO-45_Patriot_Exosuit': 'ASDWASS',
+  'A-G-16_Gatling_Sentry': 'SWDA',
+  'A-MG-43_Machine_Gun_Sentry': 'SWDDW',
+  'E-FLAM-40_Flame_Sentry': 'SWDSWW',
+  'A-MLS-4X_Rocket_Sentry': 'SWDDA',
+  'A-LAS-98_Laser_Sentry': 'SWDSWD',
+  'A-AC-8_Autocannon_Sentry': 'SWDWAW',
+  'A-M-23_EMS_Mortar_Sentry': 'SWDSD',
+  'A-M-12_Mortar_Sentry': 'SWDDS',
+  'FX-12_Shield_Generator_Relay': 'SSADAD',
+  'E-GL-21_Grenadier_Battlement': 'SDSAD',
+  'E-AT-12_Anti-Tank_Emplacement': 'SWADDD',
+  'E-MG-101_HMG_Emplacement': 'SWADDA',
+  'A-ARC-3_Tesla_Tower': 'SWDWAD',
+  'MD-17_Anti-Tank_Mines': 'SAWW',
+  'MD-8_Gas_Mines': 'SAAD',
+  'MD-6_Anti-Personnel_Minefield': 'SAWD',
+  'MD-14_Incendiary_Mines': 'SAAS',
+  SOS_Beacon: 'WSDW',
+  'NUX-223_Hellbomb': 'SWASWDSW',
+  SSSD_Delivery: 'SSSWW',
+  Seismic_Probe: 'WWADSS',
+  Upload_Data: 'ADWWW',
+  Eagle_Rearm: 'WWAWD',
+  Hive_Breaker_Drill: 'AWSDSS',
+  Prospecting_Drill: 'SSADSS',
+  Super_Earth_Flag: 'SWSW',
+  SEAF_Artillery: 'DWWS',
+}
+
 // Create reverse mapping: icon filename (without .webp) → macro key
 export const ICON_TO_KEY = {}
 Object.keys(MACRO_IMAGES).forEach((key) => {
@@ -18,10 +18,21 @@ export const useMacrolinkStore = defineStore('macrolink', () => {
   const selectedProfile = ref(localStorage.getItem('selectedProfile') || '')
   const showUserSelect = ref(false)
 
-  // User mapping
-  const userMap = {
-    green: 'user1',
-    blue: 'user2',
+  // Devices from the backend registry: [{ name, user }], where `user` is the key
+  // profiles and triggers for that device use
+  const devices = ref([])
+  const loadoutSync = ref(false) // MACROLINK_LOADOUT_SYNC on the backend
+  const devicesLoaded = fetch('/devices.json')
+    .then((response) => response.json())
+    .then((data) => {
+      devices.value = data.devices
+      loadoutSync.value = Boolean(data.loadout_sync)
+    })
+    .catch((error) => console.error('Failed to load devices:', error))
+
+  async function userKey(device) {
+    await devicesLoaded
+    return devices.value.find((d) => d.name === device)?.user || device
   }
 
   // Watch and persist to localStorage
@@ -82,13 +93,32 @@ export const useMacrolinkStore = defineStore('macrolink', () => {
     return { error: 'Macro not found' }
   }
 
+  // All profiles of one user as { name: macros }, following the paginated /profiles/<user> listing.
+  // Keys come back sorted by lowercase name (the listing's cursor order), not in creation order.
+  async function fetchUserProfiles(jsonKey) {
+    const userProfiles = {}
+    let cursor = null
+    do {
+      const params = new URLSearchParams({ limit: '500' })
+      if (cursor) params.set('cursor', cursor)
+      const response = await fetch(`/profiles/${encodeURIComponent(jsonKey)}?${params}`)
+      if (!response.ok) throw new Error(`Failed to list profiles: ${response.status}`)
+      const page = await response.json()
+      for (const entry of page.profiles) {
+        userProfiles[entry.name] = entry.macros
+      }
+      cursor = page.next_cursor
+    } while (cursor)
+    return userProfiles
+  }
+
   async function loadProfile(user, profile) {
     try {
-      const response = await fetch('/all_profiles')
-      const allProfilesData = await response.json()
-
-      const jsonKey = userMap[user] || user
-      const profileMacros = allProfilesData[jsonKey]?.[profile]
+      const jsonKey = await userKey(user)
+      const response = await fetch(
+        `/profiles/${encodeURIComponent(jsonKey)}/${encodeURIComponent(profile)}`,
+      )
+      const profileMacros = response.ok ? (await response.json()).macros : null
 
       if (profileMacros && Array.isArray(profileMacros)) {
         // Filter out Reinforce and Resupply (already in static slots)
@@ -110,6 +140,15 @@ export const useMacrolinkStore = defineStore('macrolink', () => {
 
         // Combine static (1-2) + dynamic (3-10), max 8 dynamic
         macros.value = [...STATIC_MACROS, ...dynamicMacros.slice(0, 8)]
+
+        // Push the loadout to the device, when the backend has loadout sync enabled
+        if (loadoutSync.value) {
+          fetch('/sync_loadout', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ user: jsonKey, profile }),
+          }).catch((error) => console.error('Failed to sync loadout:', error))
+        }
       }
     } catch (error) {
       console.error('Failed to load profile:', error)
@@ -162,6 +201,7 @@ export const useMacrolinkStore = defineStore('macrolink', () => {
   return {
     // State
     macros,
+    devices,
     showStratagems,
     showProfiles,
     removeMode,
@@ -171,7 +211,9 @@ export const useMacrolinkStore = defineStore('macrolink', () => {
     // Actions
     addMacro,
     removeMacro,
+    userKey,
     loadProfile,
+    fetchUserProfiles,
     toggleStratagems,
     toggleProfiles,
     toggleUserSelect,
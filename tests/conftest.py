@@ -0,0 +1,21 @@
+import os, sys, tempfile
+
+import pytest
+
+# app.py reads its configuration at import time: point every path at a scratch
+# directory and the devices at ports nothing listens on
+SCRATCH = tempfile.mkdtemp(prefix="macrolink-tests-")
+os.environ.update(
+    MACROLINK_PROFILE_PATH=os.path.join(SCRATCH, "profiles.json"),
+    MACROLINK_PROFILE_DB=os.path.join(SCRATCH, "profiles.db"),
+    MACROLINK_DEVICE_CONFIG=os.path.join(SCRATCH, "devices.json"),
+    MACROLINK_DEVICES="green=http://127.0.0.1:9,blue=http://127.0.0.1:9",
+    MACROLINK_LOG_LEVEL="ERROR",
+)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+@pytest.fixture
+def client():
+    import app
+    return app.app.test_client()
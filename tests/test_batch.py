@@ -0,0 +1,65 @@
+import pytest
+
+import app
+
+
+def fake_send(outcomes):
+    outcomes = iter(outcomes)
+
+    def send(target_server, macro, user):
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return send
+
+
+def post_batch(client, **body):
+    return client.post("/trigger_batch", json={"user": "user1", "macros": ["Reinforce", "Reinforce"], **body})
+
+
+def test_all_sent(client, monkeypatch):
+    monkeypatch.setattr(app, "send_trigger", fake_send([0.01, 0.01]))
+    response = post_batch(client)
+    assert response.status_code == 200
+    assert [r["status"] for r in response.get_json()["results"]] == ["success", "success"]
+
+
+def test_busy_device_passes_its_status_through(client, monkeypatch):
+    monkeypatch.setattr(app, "send_trigger", fake_send([app.DeviceBusy("rate_limited", 2)]))
+    response = post_batch(client)
+    assert response.status_code == 429
+    first, second = response.get_json()["results"]
+    assert (first["code"], first["retry_after"]) == (429, 2)
+    assert second["status"] == "skipped"
+
+
+def test_partial_failure_is_multi_status(client, monkeypatch):
+    monkeypatch.setattr(app, "send_trigger", fake_send([0.01, app.DeviceUnavailable("down")]))
+    response = post_batch(client)
+    assert response.status_code == 207
+    assert [r.get("code") for r in response.get_json()["results"]] == [None, 503]
+
+
+def test_mixed_failures_are_multi_status(client, monkeypatch):
+    monkeypatch.setattr(app, "send_trigger", fake_send([app.DeviceBusy("rate_limited", 1), app.DeviceUnavailable("down")]))
+    response = post_batch(client, stop_on_error=False)
+    assert response.status_code == 207
+    assert [r["code"] for r in response.get_json()["results"]] == [429, 503]
+
+
+def test_unknown_macro_is_404(client):
+    response = client.post("/trigger_batch", json={"user": "user1", "macros": ["Reinforce", "Nope"]})
+    assert response.status_code == 404
+    assert response.get_json()["unknown"] == ["Nope"]
+
+
+@pytest.mark.parametrize("body", [
+    {"delay_ms": True},
+    {"macros": [{"macro": "Reinforce", "delay_ms": False}]},
+    {"stop_on_error": "no"},
+    {"stop_on_error": 1},
+])
+def test_bools_and_delays_are_strict(client, body):
+    response = post_batch(client, **body)
+    assert response.status_code == 400
@@ -0,0 +1,61 @@
+import time
+
+import app
+
+
+def unreachable(*args, **kwargs):
+    raise app.requests.exceptions.ConnectTimeout("down")
+
+
+def test_success_during_open_stays_closed(monkeypatch):
+    # An in-flight request that succeeds closes the circuit; the probe thread must not reopen it
+    monkeypatch.setattr(app.device_pool, "get", unreachable)
+    breaker = app.CircuitBreaker("http://127.0.0.1:9", threshold=2, probe_interval=0.2, probe_max_interval=0.2)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    breaker.record_success()
+    assert breaker.state == breaker.CLOSED
+    time.sleep(0.6)
+    assert breaker.state == breaker.CLOSED
+    assert breaker.allow()
+    assert breaker._probe is None
+
+
+def test_one_probe_thread_per_device(monkeypatch):
+    monkeypatch.setattr(app.device_pool, "get", unreachable)
+    breaker = app.CircuitBreaker("http://127.0.0.1:9", threshold=1, probe_interval=0.2, probe_max_interval=0.2)
+    breaker.record_failure()
+    probe = breaker._probe
+    breaker.record_success()
+    breaker.record_failure()  # re-trip before the first probe noticed the close
+    assert breaker._probe is probe
+    time.sleep(0.5)
+    assert breaker.state in (breaker.OPEN, breaker.HALF_OPEN)
+    assert breaker._probe is probe and probe.is_alive()
+
+
+def test_probe_closes_circuit_when_device_answers(monkeypatch):
+    monkeypatch.setattr(app.device_pool, "get", lambda *a, **kw: None)
+    breaker = app.CircuitBreaker("http://127.0.0.1:9", threshold=1, probe_interval=0.1)
+    breaker.record_failure()
+    time.sleep(0.4)
+    assert breaker.state == breaker.CLOSED
+    assert breaker._probe is None
+
+
+def test_probe_waits_for_the_limiter(monkeypatch):
+    probes = []
+    monkeypatch.setattr(app.device_pool, "get", lambda *a, **kw: probes.append(a))
+    url = "http://127.0.0.1:9/busy"
+    limiter = app.DeviceLimiter(url, max_inflight=1)
+    monkeypatch.setitem(app.limiters, url, limiter)
+    assert limiter.try_acquire(app.DeviceLimiter.TRIGGER)
+    breaker = app.CircuitBreaker(url, threshold=1, probe_interval=0.1)
+    breaker.record_failure()
+    time.sleep(0.35)
+    assert not probes and breaker.state == breaker.OPEN
+    limiter.release()
+    time.sleep(0.3)
+    assert len(probes) == 1 and breaker.state == breaker.CLOSED
+    assert limiter.inflight == 0
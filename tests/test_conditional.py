@@ -0,0 +1,56 @@
+import gzip
+import zlib
+
+import app
+
+
+def test_profiles_revalidate_until_changed(client):
+    first = client.get("/all_profiles")
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+    assert client.get("/all_profiles", headers={"If-None-Match": etag}).status_code == 304
+
+    with app.profile_store.lock("user1"):
+        app.profile_store.save("user1", "etag-test", ["Reinforce"])
+    changed = client.get("/all_profiles", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_status_is_weakly_tagged(client, monkeypatch):
+    poller = app.status_poller
+    monkeypatch.setattr(poller, "start", lambda: None)
+    monkeypatch.setattr(poller, "is_stale", lambda: False)
+    first = client.get("/dashboard/status.json")
+    assert first.headers["ETag"].startswith('W/"s-')
+    assert client.get("/dashboard/status.json", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+
+def test_large_json_is_gzipped(client):
+    plain = client.get("/macros.json")
+    assert "Content-Encoding" not in plain.headers
+    assert len(plain.data) >= app.JSON_COMPRESS_MIN_SIZE
+
+    packed = client.get("/macros.json", headers={"Accept-Encoding": "gzip"})
+    assert packed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in packed.headers["Vary"]
+    assert gzip.decompress(packed.data) == plain.data
+    # The encoded bytes differ from the identity body, so the tag is weakened but still matches
+    assert packed.headers["ETag"] == "W/" + plain.headers["ETag"]
+    revalidated = client.get("/macros.json", headers={"Accept-Encoding": "gzip", "If-None-Match": packed.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+
+def test_deflate_when_gzip_is_not_accepted(client):
+    packed = client.get("/macros.json", headers={"Accept-Encoding": "deflate"})
+    assert packed.headers["Content-Encoding"] == "deflate"
+    assert zlib.decompress(packed.data) == client.get("/macros.json").data
+
+
+def test_small_json_is_sent_as_is(client):
+    response = client.get("/profiles/user1/no-such-profile", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 404
+    assert "Content-Encoding" not in response.headers
+    response = client.get("/devices.json", headers={"Accept-Encoding": "gzip"})
+    assert len(response.data) < app.JSON_COMPRESS_MIN_SIZE
+    assert "Content-Encoding" not in response.headers
@@ -0,0 +1,74 @@
+import socket, threading
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def hangup_server():
+    # Reads each request and closes the connection without answering, like a Pico
+    # that drops the socket after it has already started typing the macro
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(8)
+    requests_seen = []
+
+    def serve():
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                return
+            requests_seen.append(conn.recv(4096).split(b"\r\n", 1)[0])
+            conn.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}", requests_seen
+    sock.close()
+
+
+def test_trigger_is_not_resent_after_hangup(hangup_server):
+    base_url, seen = hangup_server
+    pool = app.DevicePool()
+    with pytest.raises(app.requests.exceptions.ConnectionError):
+        pool.get(base_url, "Reinforce", timeout=1)
+    assert seen == [b"GET /Reinforce HTTP/1.1"]
+
+
+def test_status_read_is_retried_once(hangup_server):
+    base_url, seen = hangup_server
+    pool = app.DevicePool()
+    with pytest.raises(app.requests.exceptions.ConnectionError):
+        pool.get(base_url, "/system/status.json", timeout=1, retry=True)
+    assert len(seen) == 2
+
+
+def test_refused_connection_is_not_retried(monkeypatch):
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    base_url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    sock.close()  # nothing listens there now
+    pool = app.DevicePool()
+    resets = []
+    monkeypatch.setattr(pool, "reset", resets.append)
+    with pytest.raises(app.requests.exceptions.ConnectionError):
+        pool.get(base_url, "/system/status.json", timeout=1, retry=True)
+    assert resets == []
+
+
+def test_request_id_is_added_to_caller_headers(monkeypatch):
+    pool = app.DevicePool()
+    sent = {}
+
+    class Session:
+        def request(self, method, url, timeout, **kwargs):
+            sent.update(kwargs)
+
+    monkeypatch.setattr(pool, "session", lambda base_url: Session())
+    token = app.request_id_var.set("abc123")
+    try:
+        pool.request("POST", "http://device", "/system/loadout", timeout=1, headers={"X-Loadout": "7"})
+    finally:
+        app.request_id_var.reset(token)
+    assert sent["headers"] == {"X-Request-ID": "abc123", "X-Loadout": "7"}
@@ -0,0 +1,54 @@
+import threading
+import time
+
+import app
+
+
+def dispatcher(monkeypatch, window=1.0):
+    sent, release = [], threading.Event()
+
+    def send(base_url, macro, user):
+        sent.append(macro)
+        release.wait(2)
+
+    monkeypatch.setattr(app, "send_trigger", send)
+    return app.TriggerDispatcher("http://127.0.0.1:9/dispatch", maxsize=4, coalesce_window=window), sent, release
+
+
+def wait_for(predicate, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_repeats_coalesce_while_queued(monkeypatch):
+    d, sent, release = dispatcher(monkeypatch)
+    first = d.submit("Reinforce", "user1")
+    wait_for(lambda: first["status"] == "sending")  # holds the worker
+    queued = d.submit("Resupply", "user1")
+    assert d.submit("Resupply", "user1") is queued
+    assert queued["coalesced"] == 1
+    release.set()
+    wait_for(lambda: queued["status"] == "success")
+    assert sent == ["Reinforce", "Resupply"]
+
+
+def test_press_after_completion_is_sent(monkeypatch):
+    d, sent, release = dispatcher(monkeypatch)
+    release.set()
+    first = d.submit("Reinforce", "user1")
+    wait_for(lambda: first["status"] == "success")
+    second = d.submit("Reinforce", "user1")  # inside the window, but the first is done
+    assert second is not first
+    wait_for(lambda: second["status"] == "success")
+    assert sent == ["Reinforce", "Reinforce"]
+
+
+def test_full_queue_rejects(monkeypatch):
+    d, sent, release = dispatcher(monkeypatch, window=-1)  # never coalesce
+    first = d.submit("Reinforce", "user1")
+    wait_for(lambda: first["status"] == "sending")
+    tickets = [d.submit("Reinforce", "user1") for _ in range(5)]
+    assert tickets[-1] is None and all(tickets[:4])
+    release.set()
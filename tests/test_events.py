@@ -0,0 +1,20 @@
+import time
+
+import app
+
+
+def test_status_diff_carries_rendered_fields(monkeypatch):
+    published = []
+    monkeypatch.setattr(app.events, "publish", lambda event, data: published.append((event, data)))
+    monkeypatch.setattr(app.EventBroadcaster, "__len__", lambda self: 1)  # a subscriber is connected
+    monkeypatch.setattr(app, "telemetry", app.TelemetryHistory(capacity=4))
+    poller = app.StatusPoller(app.device_registry)
+    poller.store({"green": ({"uptime": 1}, None, time.monotonic())})
+    first = published[-1][1]["green"]["set"]
+    assert {"uptime", "circuit", "limits", "poll_age"} <= set(first)
+
+    # Same device data, but the circuit moved: the diff must say so
+    breaker = app.breaker_for(app.device_registry.all()["green"])
+    monkeypatch.setattr(breaker, "snapshot", lambda: {"state": "open", "failures": 3})
+    poller.store({"green": ({"uptime": 1}, None, time.monotonic())})
+    assert published[-1][1]["green"]["set"]["circuit"] == {"state": "open", "failures": 3}
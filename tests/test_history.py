@@ -0,0 +1,25 @@
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("query", [
+    "start=nan", "end=inf", "start=-inf", "resolution=nan", "resolution=inf", "start=1e400",
+    "start=abc", "start=10&end=5", "start=0&end=10&resolution=-1",
+])
+def test_bad_range_is_rejected(client, query):
+    response = client.get(f"/dashboard/history.json?{query}")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_unknown_metric_is_rejected(client):
+    response = client.get("/dashboard/history.json?metrics=cpu_temp,bogus")
+    assert response.status_code == 400
+    assert response.get_json()["unknown"] == ["bogus"]
+
+
+def test_valid_range(client):
+    response = client.get("/dashboard/history.json?start=0&end=3600&resolution=60")
+    assert response.status_code == 200
+    assert response.get_json()["resolution"] == 60
@@ -0,0 +1,123 @@
+import threading
+import time
+
+import app
+
+TRIGGER, CONTROL, STATUS = app.DeviceLimiter.TRIGGER, app.DeviceLimiter.CONTROL, app.DeviceLimiter.STATUS
+
+
+def limiter(**kwargs):
+    options = dict(rate=10, burst=2, max_inflight=4, max_waiting=4, max_wait=0.5, enabled=True)
+    options.update(kwargs)
+    return app.DeviceLimiter("http://device", **options)
+
+
+def test_tokens_refill_at_the_rate():
+    lim = limiter()
+    assert lim.try_acquire(TRIGGER) and lim.try_acquire(TRIGGER)
+    assert not lim.try_acquire(TRIGGER)
+    lim._refilled_at -= 0.1  # one token's worth of time at 10/s
+    assert lim.try_acquire(TRIGGER)
+    assert not lim.try_acquire(TRIGGER)
+
+
+def test_refill_stops_at_the_burst():
+    lim = limiter()
+    lim._refilled_at -= 60
+    assert lim.snapshot()["tokens"] == 2
+
+
+def test_in_flight_cap():
+    lim = limiter(rate=0, max_inflight=1)
+    assert lim.try_acquire(TRIGGER)
+    assert not lim.try_acquire(TRIGGER)
+    lim.release()
+    assert lim.try_acquire(TRIGGER)
+
+
+def test_status_polls_leave_room_for_triggers():
+    lim = limiter(rate=0, max_inflight=2)
+    assert lim.try_acquire(TRIGGER)
+    assert not lim.try_acquire(STATUS)  # would take the last slot
+    assert lim.try_acquire(TRIGGER)
+
+
+def test_waiting_trigger_holds_back_lower_priorities():
+    lim = limiter(rate=0)
+    assert lim.enqueue(TRIGGER)
+    assert not lim.try_acquire(CONTROL)
+    assert not lim.try_acquire(STATUS)
+    lim.dequeue(TRIGGER)
+    assert lim.try_acquire(CONTROL)
+
+
+def test_waiter_gets_the_released_slot():
+    lim = limiter(rate=0, max_inflight=1)
+    lim.acquire(TRIGGER)
+    started = threading.Event()
+
+    def waiter():
+        lim.acquire(TRIGGER)
+        started.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    while not lim.waiting[TRIGGER]:
+        time.sleep(0.001)
+    lim.release()
+    assert started.wait(1)
+    thread.join()
+    assert lim.inflight == 1
+
+
+def test_status_polls_do_not_wait():
+    lim = limiter(rate=0, max_inflight=1)
+    lim.acquire(TRIGGER)
+    try:
+        lim.acquire(STATUS)
+    except app.DeviceBusy as e:
+        assert (e.reason, e.status) == ("saturated", 503)
+    else:
+        raise AssertionError("status poll was not rejected")
+    assert lim.waiting == [0, 0, 0]
+
+
+def test_rejections_carry_status_and_retry_after():
+    lim = limiter(rate=4, burst=1)
+    lim.acquire(TRIGGER)
+    busy = lim.reject(TRIGGER)
+    assert (busy.reason, busy.status) == ("rate_limited", 429)
+    assert 0 < busy.retry_after <= 0.25
+    assert lim.rejected["rate_limited"] == 1
+
+    lim = limiter(rate=0, max_inflight=1)
+    lim.acquire(TRIGGER)
+    busy = lim.reject(TRIGGER)
+    assert (busy.reason, busy.status, busy.retry_after) == ("saturated", 503, 1.0)
+
+
+def test_disabled_limiter_only_counts():
+    lim = limiter(burst=1, max_inflight=1, enabled=False)
+    assert lim.try_acquire(TRIGGER) and lim.try_acquire(TRIGGER)
+    assert lim.inflight == 2
+
+
+def test_trigger_route_answers_429_with_retry_after(client, monkeypatch):
+    lim = limiter(rate=0.5, burst=1, max_wait=0)
+    lim.acquire(TRIGGER)
+    monkeypatch.setattr(app, "limiter_for", lambda base_url: lim)
+    monkeypatch.setattr(app, "breaker_for", lambda base_url: app.CircuitBreaker(base_url))
+    response = client.get("/trigger/Reinforce?user=user1")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    assert 0 < response.get_json()["retry_after"] <= 2
+
+
+def test_trigger_route_answers_503_when_saturated(client, monkeypatch):
+    lim = limiter(rate=0, max_inflight=1, max_wait=0)
+    lim.acquire(TRIGGER)
+    monkeypatch.setattr(app, "limiter_for", lambda base_url: lim)
+    monkeypatch.setattr(app, "breaker_for", lambda base_url: app.CircuitBreaker(base_url))
+    response = client.get("/trigger/Reinforce?user=user1")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,33 @@
+import app
+
+URL = "http://127.0.0.1:9/loadout"
+
+
+def verified(sync):
+    table, _ = app.compile_loadout(["Reinforce"])
+    state = sync._devices[URL] = app.DeviceLoadout()
+    state.table, state.slot_index, state.uptime = table, {"Reinforce": 0}, 100
+    return state, {"uptime": 101, "macros": {table[0].key: table[0].sequence}}
+
+
+def test_check_survives_a_failed_sync_clearing_the_table():
+    sync = app.LoadoutSync()
+    state, data = verified(sync)
+    state.table = None  # what a failed sync() leaves behind
+    sync.check(URL, data)
+    assert state.slot_index == {"Reinforce": 0}  # left for the next sync to settle
+
+
+def test_check_skips_while_a_sync_holds_the_device():
+    sync = app.LoadoutSync()
+    state, data = verified(sync)
+    with state.lock:
+        sync.check(URL, dict(data, uptime=5))  # would look like a reboot
+    assert state.slot_index
+
+
+def test_check_drops_slots_after_a_reboot():
+    sync = app.LoadoutSync()
+    state, data = verified(sync)
+    sync.check(URL, dict(data, uptime=5))
+    assert state.slot_index == {} and state.table is None
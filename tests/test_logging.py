@@ -0,0 +1,47 @@
+import os
+import signal
+import time
+
+import pytest
+
+import app
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_worker_starts_its_own_listener():
+    app.log.error("before fork")  # the parent's listener is running now
+    assert app.log_listener_pid == os.getpid()
+    # Fork once the record is written: a fork mid-write would leave stdout's lock held in the child
+    deadline = time.monotonic() + 5
+    while not any(record["msg"] == "before fork" for record in app.log_ring.records):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    pid = os.fork()
+    if pid == 0:
+        ok = app.log_listener is None
+        app.log.error("from the worker")
+        ok = ok and app.log_listener_pid == os.getpid() and app.log_listener._thread.is_alive()
+        app.log_listener.stop()
+        os._exit(0 if ok else 1)
+    deadline = time.monotonic() + 10
+    while True:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done or time.monotonic() > deadline:
+            break
+        time.sleep(0.01)
+    if not done:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        pytest.fail("worker hung while logging")
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_route_settings_skip_invalid_entries(monkeypatch):
+    monkeypatch.setenv("MACROLINK_LOG_ROUTES", "trigger_macro=warning, catch_all=LOUD,index=10,broken")
+    monkeypatch.setattr(app, "LOG_CONFIG_ERRORS", [])
+    levels = app.parse_route_settings("MACROLINK_LOG_ROUTES", app.parse_log_level)
+    assert levels == {"trigger_macro": 30, "index": 10}
+    assert [entry for _, entry in app.LOG_CONFIG_ERRORS] == ["catch_all=LOUD", "broken"]
+
+    monkeypatch.setenv("MACROLINK_LOG_SAMPLE", "combined_status=0.1,catch_all=often,index=2")
+    assert app.parse_route_settings("MACROLINK_LOG_SAMPLE", app.parse_sample_rate) == {"combined_status": 0.1}
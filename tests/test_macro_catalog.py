@@ -0,0 +1,25 @@
+import json
+
+import pytest
+
+import app
+from macro_catalog import compile_macro_catalog, load_macro_data
+
+
+def test_built_json_is_preferred(tmp_path):
+    built = tmp_path / "macro-data.json"
+    built.write_text(json.dumps({"STATIC_MACROS": {"Reinforce": "Reinforce"},
+                                 "MACRO_SEQUENCES": {"Reinforce": "wsdaw"}}))
+    catalog = compile_macro_catalog(load_macro_data(str(built), str(tmp_path / "missing.js")))
+    assert list(catalog) == ["Reinforce"]
+    assert catalog["Reinforce"].sequence == "WSDAW"
+
+
+def test_source_fallback_matches_catalog():
+    objects = load_macro_data("/nonexistent/macro-data.json")
+    assert compile_macro_catalog(objects) == app.MACRO_CATALOG
+
+
+def test_missing_catalog_fails_loudly(tmp_path):
+    with pytest.raises(RuntimeError, match="npm run build"):
+        load_macro_data(str(tmp_path / "macro-data.json"), str(tmp_path / "macroData.js"))
@@ -0,0 +1,42 @@
+import app
+
+
+def test_counter_renders_labels_escaped(monkeypatch):
+    monkeypatch.setattr(app, "metrics_registry", [])
+    counter = app.Counter("test_total", "A test counter", ("device",))
+    counter.inc("green")
+    counter.inc("green", amount=2)
+    counter.inc('say "hi"\n')
+    assert counter.render() == [
+        "# HELP test_total A test counter",
+        "# TYPE test_total counter",
+        'test_total{device="green"} 3',
+        'test_total{device="say \\"hi\\"\\n"} 1',
+    ]
+    assert app.metrics_registry == [counter]
+
+
+def test_histogram_buckets_are_cumulative(monkeypatch):
+    monkeypatch.setattr(app, "metrics_registry", [])
+    histogram = app.Histogram("test_seconds", "A test histogram", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{le="0.1"} 2',
+        'test_seconds_bucket{le="1.0"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        "test_seconds_sum 3.65",
+        "test_seconds_count 4",
+    ]
+
+
+def test_metrics_endpoint(client):
+    with app.profile_store.lock("user1"):
+        app.profile_store.save("user1", "metrics-test", ["Reinforce"])
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    for metric in app.metrics_registry:
+        assert f"# TYPE {metric.name} " in text
+    assert 'macrolink_profile_store_duration_seconds_count{kind="write",op="save"}' in text
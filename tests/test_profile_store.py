@@ -0,0 +1,115 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import app
+
+
+def stores(tmp_path):
+    # Two stores on one file stand in for two worker processes
+    path = str(tmp_path / "profiles.json")
+    return app.JsonProfileStore(path, locking="process"), app.JsonProfileStore(path, locking="process")
+
+
+def test_write_bumps_the_generation(tmp_path):
+    writer, _ = stores(tmp_path)
+    with writer.lock():
+        writer.save("user1", "a", ["x"])
+    with writer.lock():
+        writer.save("user1", "b", ["y"])
+    assert writer._file_lock.generation() == 2
+    assert writer._stamp == writer._file_stamp()  # its own write is not re-read
+
+
+def test_other_writer_seen_when_stat_repeats(tmp_path):
+    writer, reader = stores(tmp_path)
+    with writer.lock():
+        writer.save("user1", "a", ["x"])
+    assert reader.get("user1", "a") == ["x"]
+    with writer.lock():
+        writer.save("user1", "a", ["z"])
+    # A reused inode with the same mtime and size: only the generation tells the files apart
+    reader._stamp = (reader._stamp[0],) + writer._file_stamp()[1:]
+    assert reader.get("user1", "a") == ["z"]
+
+
+def test_hand_edit_still_noticed(tmp_path):
+    writer, reader = stores(tmp_path)
+    with writer.lock():
+        writer.save("user1", "a", ["x"])
+    assert reader.get("user1", "a") == ["x"]
+    with open(writer.path, "w") as f:
+        f.write('{"user1": {"a": ["edited", "by", "hand"]}}')
+    assert reader.get("user1", "a") == ["edited", "by", "hand"]
+
+
+def test_empty_lock_file_is_generation_zero(tmp_path):
+    path = str(tmp_path / "profiles.json")
+    open(path + ".lock", "w").close()  # left by a version without generations
+    store = app.JsonProfileStore(path, locking="process")
+    assert store._file_lock.generation() == 0
+    assert store.all() == {}
+    assert not os.path.exists(path)
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_rename_keeps_position(tmp_path, backend):
+    if backend == "json":
+        store = app.JsonProfileStore(str(tmp_path / "profiles.json"), locking="process")
+    else:
+        store = app.SqliteProfileStore(str(tmp_path / "profiles.db"))
+    with store.lock("user1"):
+        for name in ("first", "second", "third"):
+            store.save("user1", name, [name])
+        store.rename("user1", "first", "renamed")
+    assert store.names("user1") == ["renamed", "second", "third"]
+    assert store.get("user1", "renamed") == ["first"]
+
+
+def other_worker_can_lock(path, operation):
+    # A separate process, like another worker, trying the lock file without waiting
+    code = ("import fcntl, os, sys\n"
+            "fd = os.open(sys.argv[1], os.O_RDWR)\n"
+            "try:\n"
+            "    fcntl.flock(fd, getattr(fcntl, sys.argv[2]) | fcntl.LOCK_NB)\n"
+            "except BlockingIOError:\n"
+            "    sys.exit(1)\n")
+    return subprocess.run([sys.executable, "-c", code, path, operation]).returncode == 0
+
+
+@pytest.mark.skipif(app.fcntl is None, reason="needs fcntl")
+def test_readers_share_the_file_lock(tmp_path):
+    store, _ = stores(tmp_path)
+    with store.lock("user1"):
+        store.save("user1", "a", ["x"])
+    lock_path = store.path + ".lock"
+    with store.lock("user1", shared=True):
+        assert store.get("user1", "a") == ["x"]
+        assert other_worker_can_lock(lock_path, "LOCK_SH")
+        assert not other_worker_can_lock(lock_path, "LOCK_EX")
+    with store.lock("user1"):
+        assert not other_worker_can_lock(lock_path, "LOCK_SH")
+
+
+def test_migrate_profiles_keeps_order(tmp_path):
+    json_path, db_path = str(tmp_path / "profiles.json"), str(tmp_path / "profiles.db")
+    with open(json_path, "w") as f:
+        f.write('{"user1": {"zeta": ["Reinforce"], "Alpha": ["Resupply"]}, "user2": {"only": []}}')
+    assert app.migrate_profiles(json_path, db_path) == (3, [])
+    assert app.migrate_profiles(json_path, db_path) == (3, [])  # running it again overwrites, not duplicates
+    store = app.SqliteProfileStore(db_path)
+    assert store.names("user1") == ["zeta", "Alpha"]
+    assert store.get("user1", "alpha") == ["Resupply"]
+    assert store.all() == {"user1": {"zeta": ["Reinforce"], "Alpha": ["Resupply"]}, "user2": {"only": []}}
+
+
+def test_migrate_profiles_reports_collisions(tmp_path):
+    json_path, db_path = str(tmp_path / "profiles.json"), str(tmp_path / "profiles.db")
+    with open(json_path, "w") as f:
+        f.write('{"user1": {"Solo": ["Reinforce"], "solo ": ["Resupply"], "duo": []}, "user2": {"solo": []}}')
+    assert app.migrate_profiles(json_path, db_path) == (3, [("user1", "solo ", "Solo")])
+    store = app.SqliteProfileStore(db_path)
+    assert store.names("user1") == ["Solo", "duo"]
+    assert store.get("user1", "solo") == ["Reinforce"]
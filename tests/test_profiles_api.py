@@ -0,0 +1,113 @@
+import pytest
+
+import app
+
+
+def test_profile_name_with_slash(client):
+    with app.profile_store.lock("user1"):
+        app.profile_store.save("user1", "a/b", ["Reinforce"])
+    response = client.get("/profiles/user1/a%2Fb")
+    assert response.status_code == 200
+    assert response.get_json()["macros"] == ["Reinforce"]
+
+
+def test_missing_profile_is_json_404(client):
+    response = client.get("/profiles/user1/no/such/profile")
+    assert response.status_code == 404
+    assert response.get_json() == {"error": "Profile not found"}
+
+
+def test_devices_report_loadout_sync(client):
+    data = client.get("/devices.json").get_json()
+    assert data["loadout_sync"] is app.LOADOUT_SYNC
+    assert {device["name"] for device in data["devices"]} >= {"green", "blue"}
+
+
+def test_save_rejects_unknown_macros(client):
+    response = client.post("/save_profile", json={"user": "user1", "profile": "p", "macros": ["Reinforce", "Nope"]})
+    assert response.status_code == 400
+    assert response.get_json()["unknown"] == ["Nope"]
+    response = client.post("/save_profile", json={"user": "user1", "profile": "p", "macros": ["reinforce"]})
+    assert response.status_code == 200
+
+
+def test_import_skips_unknown_macros(client):
+    body = ('{"user": "user1", "profile": "ok", "macros": ["Reinforce"]}\n'
+            '{"user": "user1", "profile": "bad", "macros": ["Nope"]}\n')
+    data = client.post("/profiles/import", data=body).get_json()
+    assert data["imported"] == 1 and data["rejected"] == 1
+    assert "Nope" in data["errors"][0]["error"]
+
+
+def test_import_takes_each_users_lock(client, monkeypatch):
+    locked = []
+    real_lock = app.profile_store.lock
+    monkeypatch.setattr(app.profile_store, "lock", lambda user=None, shared=False: locked.append(user) or
+                        real_lock(user, shared))
+    body = "".join(f'{{"user": "{user}", "profile": "p{i}", "macros": ["Reinforce"]}}\n'
+                   for i, user in enumerate(["user1", "user2", "user1"]))
+    assert client.post("/profiles/import", data=body).get_json()["imported"] == 3
+    assert sorted(locked) == ["user1", "user2"]
+
+
+def save_profiles(user, count):
+    # Each test pages its own user: the store is shared by the whole session
+    with app.profile_store.lock(user):
+        app.profile_store.save_many([(user, f"p{i:02}", ["Reinforce"]) for i in range(count)])
+
+
+def test_cursor_pages_through_every_profile(client):
+    save_profiles("pager", 5)
+    names, cursor = [], None
+    while True:
+        query = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/profiles/pager", query_string=query).get_json()
+        assert len(page["profiles"]) <= 2
+        names += [profile["name"] for profile in page["profiles"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert names == [f"p{i:02}" for i in range(5)]
+
+
+def test_page_stays_stable_when_an_earlier_profile_is_deleted(client):
+    save_profiles("pager-delete", 5)
+    first = client.get("/profiles/pager-delete?limit=2").get_json()
+    with app.profile_store.lock("pager-delete"):
+        app.profile_store.delete("pager-delete", "p00")
+    second = client.get("/profiles/pager-delete", query_string={"limit": 2, "cursor": first["next_cursor"]}).get_json()
+    assert [profile["name"] for profile in second["profiles"]] == ["p02", "p03"]
+
+
+@pytest.mark.parametrize("query", ["limit=0", "limit=1001", "limit=x", "cursor=%25%25"])
+def test_bad_page_query_is_rejected(client, query):
+    assert client.get(f"/profiles/pager?{query}").status_code == 400
+
+
+def test_export_then_import_round_trips(client):
+    save_profiles("exported", 3)
+    exported = client.get("/profiles/export.ndjson?user=exported")
+    assert exported.mimetype == "application/x-ndjson"
+    body = exported.get_data(as_text=True).replace('"user": "exported"', '"user": "imported"')
+    assert client.post("/profiles/import", data=body).get_json()["imported"] == 3
+    assert app.profile_store.names("imported") == ["p00", "p01", "p02"]
+
+
+def test_import_of_only_bad_lines_is_400(client):
+    body = 'not json\n{"user": "user1"}\n[1]\n'
+    response = client.post("/profiles/import", data=body)
+    assert response.status_code == 400
+    data = response.get_json()
+    assert (data["imported"], data["rejected"]) == (0, 3)
+    assert [error["line"] for error in data["errors"]] == [1, 2, 3]
+
+
+def test_import_saves_in_batches(client, monkeypatch):
+    monkeypatch.setattr(app, "PROFILE_IMPORT_BATCH", 2)
+    saved = []
+    real_save_many = app.profile_store.save_many
+    monkeypatch.setattr(app.profile_store, "save_many", lambda entries: saved.append(len(entries)) or
+                        real_save_many(entries))
+    body = "".join(f'{{"user": "batched", "profile": "p{i}", "macros": []}}\n' for i in range(5))
+    assert client.post("/profiles/import", data=body).get_json()["imported"] == 5
+    assert saved == [2, 2, 1]
@@ -0,0 +1,52 @@
+import json
+import threading
+
+import app
+
+
+def write_devices(path, devices):
+    with open(path, "w") as f:
+        json.dump({"devices": devices}, f)
+
+
+def reload(registry):
+    registry._checked_at = 0  # skip the reload interval
+    registry._stamp = None  # the rewrite may land within the previous file's mtime tick
+    return registry.all()
+
+
+def test_removed_device_state_is_dropped(tmp_path):
+    path = str(tmp_path / "devices.json")
+    write_devices(path, {"old": "http://old.invalid", "kept": "http://kept.invalid"})
+    registry = app.DeviceRegistry(path, {}, {})
+    registry.on_removed(app.forget_device)
+    breaker = app.breaker_for("http://old.invalid")
+    app.limiter_for("http://old.invalid")
+    dispatcher = app.get_dispatcher("http://old.invalid")
+    app.limiter_for("http://kept.invalid")
+
+    write_devices(path, {"kept": "http://kept.invalid"})
+    assert dict(reload(registry)) == {"kept": "http://kept.invalid"}
+    assert "http://old.invalid" not in app.breakers
+    assert "http://old.invalid" not in app.limiters
+    assert "http://old.invalid" not in app.dispatchers
+    assert "http://kept.invalid" in app.limiters
+    assert breaker._retired
+    dispatcher._thread.join(1)
+    assert not dispatcher._thread.is_alive()
+    assert dispatcher.submit("Reinforce", "user1") is None
+
+
+def test_closing_dispatcher_fails_queued_presses(monkeypatch):
+    sending, release = threading.Event(), threading.Event()
+    monkeypatch.setattr(app, "send_trigger", lambda *args: sending.set() or release.wait(1))
+    dispatcher = app.TriggerDispatcher("http://closing.invalid", coalesce_window=-1)
+    first = dispatcher.submit("Reinforce", "user1")
+    assert sending.wait(1)
+    queued = dispatcher.submit("Reinforce", "user1")
+    dispatcher.close()
+    assert (queued["status"], queued["message"]) == ("error", "Device removed")
+    release.set()
+    dispatcher._thread.join(1)
+    assert not dispatcher._thread.is_alive()
+    assert first["status"] == "success"
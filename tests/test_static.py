@@ -0,0 +1,34 @@
+import os
+
+import app
+
+
+def touch(path, content="x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def lookup(index, relpath):
+    index._checked_at = 0  # skip the reload interval
+    return index.lookup(relpath)
+
+
+def test_new_asset_in_subdirectory_is_found(tmp_path):
+    root = str(tmp_path)
+    touch(os.path.join(root, "index.html"), "<html>")
+    touch(os.path.join(root, "assets", "index-aaaa1111.js"))
+    index = app.StaticIndex(root)
+    assert lookup(index, "assets/index-aaaa1111.js")
+    lookup(index, "index.html")  # settles the stamp over the directories found
+
+    # Only dist/assets changes: a new chunk and a precompressed variant
+    touch(os.path.join(root, "assets", "chunk-bbbb2222.js"))
+    touch(os.path.join(root, "assets", "index-aaaa1111.js.br"))
+    assert lookup(index, "assets/chunk-bbbb2222.js")
+    assert "br" in lookup(index, "assets/index-aaaa1111.js").variants
+
+
+def test_missing_index_serves_nothing(tmp_path):
+    index = app.StaticIndex(str(tmp_path))
+    assert lookup(index, "index.html") is None
@@ -0,0 +1,30 @@
+import time
+
+import app
+
+
+def test_skipped_poll_is_not_a_telemetry_sample(monkeypatch):
+    history = app.TelemetryHistory(capacity=8)
+    monkeypatch.setattr(app, "telemetry", history)
+    poller = app.StatusPoller(app.device_registry)
+    poller.store({"green": ({"uptime": 10}, None, time.monotonic())})
+    assert history._series["green"].count == 1
+
+    poller.store({"green": poller.skipped("green")})  # the device had no room for this poll
+    assert history._series["green"].count == 1
+    assert poller.render()["green"]["uptime"] == 10  # still served
+
+    poller.store({"green": ({"uptime": 15}, None, time.monotonic())})
+    assert history._series["green"].count == 2
+
+
+def test_status_tag_is_taken_before_the_body(monkeypatch):
+    calls = []
+    poller = app.status_poller
+    monkeypatch.setattr(poller, "start", lambda: None)
+    monkeypatch.setattr(poller, "is_stale", lambda: False)
+    monkeypatch.setattr(app, "status_etag", lambda: calls.append("etag") or "tag")
+    monkeypatch.setattr(poller, "render", lambda: calls.append("render") or {})
+    response = app.app.test_client().get("/dashboard/status.json")
+    assert response.status_code == 200
+    assert calls == ["etag", "render"]
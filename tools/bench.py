@@ -0,0 +1,222 @@
+"""Load/latency benchmark for the MacroLink backend.
+
+Drives /trigger/<macro>, /dashboard/status.json and the profile endpoints at
+increasing concurrency and reports throughput and p50/p95/p99 latency.
+
+Against a running backend:
+    python tools/bench.py --url http://127.0.0.1:8888
+
+Fully local (starts fake Picos and a backend on a scratch copy of profiles.json):
+    python tools/bench.py --spawn --latency-ms 15 --jitter-ms 5
+
+Check that slow device-bound Flask routes don't stall the others (add --asgi
+to run the backend under uvicorn instead of `python app.py`):
+    python tools/bench.py --spawn --asgi --check-concurrency --latency-ms 200
+"""
+import argparse, itertools, os, shutil, subprocess, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests # type: ignore
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from benchstats import percentile  # not bench_trigger: that one imports app
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+BENCH_USER = "bench"
+CHECK_USER = "user1"
+CHECK_PROFILES = {"bench-a": ["Reinforce", "Resupply", "Eagle_Airstrike"],
+                  "bench-b": ["Reinforce", "Resupply", "Orbital_Laser"]}
+
+SCENARIOS = {
+    "trigger": lambda s, url: s.get(f"{url}/trigger/Reinforce", params={"user": "user1"}, timeout=5),
+    "trigger_async": lambda s, url: s.get(f"{url}/trigger_async/Resupply", params={"user": "user1"}, timeout=5),
+    "status": lambda s, url: s.get(f"{url}/dashboard/status.json", timeout=10),
+    "all_profiles": lambda s, url: s.get(f"{url}/all_profiles", timeout=5),
+    "get_profile": lambda s, url: s.get(f"{url}/get_profile", params={"user": BENCH_USER, "profile": "bench"}, timeout=5),
+    "user_profiles": lambda s, url: s.get(f"{url}/profiles/{BENCH_USER}", timeout=5),
+    "save_profile": lambda s, url: s.post(f"{url}/save_profile", timeout=5, json={
+        "user": BENCH_USER, "profile": "bench", "macros": ["Reinforce", "Resupply", "Eagle_Airstrike"]}),
+}
+
+
+def run_level(scenario, url, concurrency, duration):
+    # Returns (latencies of successful requests, errors, 429s, wall time)
+    fn = SCENARIOS[scenario]
+    samples, errors, throttled = [], 0, 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker():
+        nonlocal errors, throttled
+        session = requests.Session()
+        local, local_errors, local_throttled = [], 0, 0
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                status = fn(session, url).status_code
+            except requests.exceptions.RequestException:
+                status = None
+            elapsed = (time.perf_counter() - start) * 1000
+            if status is not None and status < 400:
+                local.append(elapsed)
+            elif status == 429:
+                local_throttled += 1  # the device limiter, not a failure of the request path
+            else:
+                local_errors += 1
+        with lock:
+            samples.extend(local)
+            errors += local_errors
+            throttled += local_throttled
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.monotonic() - started
+    return samples, errors, throttled, wall
+
+
+def report(scenario, concurrency, samples, errors, throttled, wall):
+    if not samples:
+        print(f"{scenario:<14} {concurrency:>5}  {'-':>9}  {'-':>8}  {'-':>8}  {'-':>8}  {errors:>6}  {throttled:>6}")
+        return
+    print(f"{scenario:<14} {concurrency:>5}  {len(samples) / wall:>9.1f}  {percentile(samples, 50):>8.2f}  "
+          f"{percentile(samples, 95):>8.2f}  {percentile(samples, 99):>8.2f}  {errors:>6}  {throttled:>6}")
+
+
+def check_concurrency(url, duration, slow_workers=2):
+    # A fast Flask route must stay fast while slow ones are in flight. Loadout
+    # pushes alternate between two profiles, so each one talks to the (slow) fake
+    # device; a server that runs all Flask requests on one thread fails this.
+    session = requests.Session()
+    for name, macros in CHECK_PROFILES.items():
+        session.post(f"{url}/save_profile", json={"user": CHECK_USER, "profile": name, "macros": macros}, timeout=5)
+    baseline = run_level("get_profile", url, 1, 1)[0]
+    stop = threading.Event()
+    slow_samples = []
+
+    def slow():
+        s = requests.Session()
+        for i in itertools.count():
+            if stop.is_set():
+                return
+            start = time.perf_counter()
+            try:
+                r = s.post(f"{url}/sync_loadout", timeout=30,
+                           json={"user": CHECK_USER, "profile": list(CHECK_PROFILES)[i % 2]})
+            except requests.exceptions.RequestException:
+                continue
+            if r.status_code == 200:
+                slow_samples.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=slow, daemon=True) for _ in range(slow_workers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+    loaded = run_level("get_profile", url, 1, duration)[0]
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if not baseline or not loaded or not slow_samples:
+        print("concurrency check: no samples (is loadout sync reaching the device?)")
+        return False
+    slow_p50, fast_p50 = percentile(slow_samples, 50), percentile(loaded, 50)
+    ok = fast_p50 < slow_p50 / 2
+    print(f"concurrency check: get_profile p50 {percentile(baseline, 50):.2f} ms idle, {fast_p50:.2f} ms "
+          f"while {slow_workers} loadout pushes (p50 {slow_p50:.2f} ms) are in flight: {'ok' if ok else 'FAIL'}")
+    return ok
+
+
+def wait_for(url, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def spawn(args, workdir):
+    # Fake devices plus a backend pointed at them, using a scratch profile store
+    fake_port, backend_port = args.fake_port, args.backend_port
+    fake = subprocess.Popen([sys.executable, os.path.join(ROOT, 'tools', 'fake_pico.py'),
+                             "--port", str(fake_port), "--count", "2",
+                             "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+                             "--drop-rate", str(args.drop_rate), "--drop-mode", args.drop_mode,
+                             "--accept-delay-ms", str(args.accept_delay_ms)],
+                            stdout=subprocess.DEVNULL)
+    profiles = os.path.join(workdir, 'profiles.json')
+    shutil.copy(os.path.join(ROOT, 'profiles.json'), profiles)
+    env = dict(os.environ,
+               MACROLINK_DEVICES=f"green=http://127.0.0.1:{fake_port},blue=http://127.0.0.1:{fake_port + 1}",
+               MACROLINK_PROFILE_PATH=profiles,
+               MACROLINK_PROFILE_DB=os.path.join(workdir, 'profiles.db'),
+               MACROLINK_DEVICE_CONFIG=os.path.join(workdir, 'devices.json'),  # never the real devices.json
+               MACROLINK_LOADOUT_SYNC="1" if args.check_concurrency else "0",
+               # Measure the request path, not the per-device throttle, unless asked to
+               MACROLINK_DEVICE_LIMITS="1" if args.device_limits else "0")
+    if args.asgi:
+        command = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(backend_port)]
+    else:
+        command = [sys.executable, os.path.join(ROOT, 'app.py'), "--host", "127.0.0.1", "--port", str(backend_port)]
+    backend = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{backend_port}"
+    wait_for(f"http://127.0.0.1:{fake_port}/system/status.json")
+    wait_for(f"{url}/list_profiles?user={BENCH_USER}")
+    return url, [fake, backend]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8888", help="backend to benchmark")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=3, help="seconds per scenario and level")
+    parser.add_argument("--spawn", action="store_true", help="start fake Picos and a backend locally")
+    parser.add_argument("--device-limits", action="store_true",
+                        help="with --spawn, keep the per-device rate limiter on (off by default)")
+    parser.add_argument("--asgi", action="store_true", help="with --spawn, run the backend under uvicorn (asgi.py)")
+    parser.add_argument("--check-concurrency", action="store_true",
+                        help="with --spawn, check that slow Flask routes don't block fast ones, then exit")
+    parser.add_argument("--backend-port", type=int, default=18888)
+    parser.add_argument("--fake-port", type=int, default=19001)
+    parser.add_argument("--latency-ms", type=float, default=10)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--drop-rate", type=float, default=0)
+    parser.add_argument("--drop-mode", choices=("hang", "reset"), default="hang",
+                        help="how the fake devices drop a request (see tools/fake_pico.py)")
+    parser.add_argument("--accept-delay-ms", type=float, default=0)
+    args = parser.parse_args()
+    if args.check_concurrency and not args.spawn:
+        parser.error("--check-concurrency pushes loadouts to the devices; use it with --spawn")
+
+    processes = []
+    workdir = tempfile.mkdtemp(prefix="macrolink-bench-")
+    try:
+        url = args.url
+        if args.spawn:
+            url, processes = spawn(args, workdir)
+        # get_profile needs something to read
+        SCENARIOS["save_profile"](requests.Session(), url)
+        if args.check_concurrency:
+            sys.exit(0 if check_concurrency(url, args.duration) else 1)
+
+        print(f"{'scenario':<14} {'conc':>5}  {'req/s':>9}  {'p50 ms':>8}  {'p95 ms':>8}  {'p99 ms':>8}  {'errors':>6}  {'429':>6}")
+        for scenario in args.scenarios.split(','):
+            for concurrency in (int(c) for c in args.concurrency.split(',')):
+                report(scenario, concurrency, *run_level(scenario, url, concurrency, args.duration))
+
+        if not args.spawn:
+            requests.post(f"{url}/delete_profile", json={"user": BENCH_USER, "profile": "bench"}, timeout=5)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
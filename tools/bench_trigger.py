@@ -0,0 +1,51 @@
+"""Compare trigger latency: one-off requests.get vs the pooled device session.
+
+Usage:
+    python tools/bench_trigger.py http://192.168.50.34:8888 --path Reinforce -n 200
+"""
+import argparse, os, statistics, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import requests # type: ignore
+from app import DevicePool
+from benchstats import percentile
+
+
+def run(label, fn, count):
+    samples = []
+    errors = 0
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            fn().raise_for_status()
+        except requests.exceptions.RequestException:
+            errors += 1
+            continue
+        samples.append((time.perf_counter() - start) * 1000)
+    if not samples:
+        print(f"{label:<10} all {count} requests failed")
+        return
+    print(f"{label:<10} mean {statistics.mean(samples):7.2f} ms  p50 {percentile(samples, 50):7.2f} ms  "
+          f"p95 {percentile(samples, 95):7.2f} ms  p99 {percentile(samples, 99):7.2f} ms  errors {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base_url', help='device base URL, e.g. http://192.168.50.34:8888')
+    parser.add_argument('--path', default='system/status.json', help='path to request on the device')
+    parser.add_argument('-n', '--count', type=int, default=100)
+    parser.add_argument('--timeout', type=float, default=1)
+    args = parser.parse_args()
+
+    url = f"{args.base_url}/{args.path.lstrip('/')}"
+    pool = DevicePool()
+    pool.get(args.base_url, args.path, timeout=args.timeout)  # warm the pooled connection
+
+    run('per-call', lambda: requests.get(url, timeout=args.timeout), args.count)
+    run('pooled', lambda: pool.get(args.base_url, args.path, timeout=args.timeout), args.count)
+    pool.close()
+
+
+if __name__ == '__main__':
+    main()
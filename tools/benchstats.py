@@ -0,0 +1,10 @@
+"""Latency statistics shared by the benchmark scripts.
+
+Kept free of app imports: importing app starts the backend's threads.
+"""
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
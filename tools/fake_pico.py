@@ -0,0 +1,224 @@
+"""Local stand-in for a MacroLink Pico W, for testing app.py without hardware.
+
+Implements the firmware's HTTP surface: /system/status.json, one route per
+macro (/<macro_key>) and /system/reboot, plus the loadout endpoints used by
+MACROLINK_LOADOUT_SYNC (POST /system/loadout, /slot/<n>). Latency, jitter,
+dropped requests and slow connection accepts can be simulated. A dropped request
+hangs without an answer, like a Pico whose server loop stalled, so clients hit
+their timeouts; --drop-mode reset closes the connection at once instead.
+
+Usage:
+    python tools/fake_pico.py --port 9001 --count 2 --latency-ms 20 --jitter-ms 10
+    MACROLINK_DEVICES=green=http://127.0.0.1:9001,blue=http://127.0.0.1:9002 python app.py
+"""
+import argparse, json, os, random, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from macro_catalog import load_macro_catalog  # not app: importing it starts the backend's threads
+
+DEVICE_NAMES = ("green", "blue", "red", "yellow", "purple", "orange", "white", "black")
+MEMORY_TOTAL = 192 * 1024
+DROP_MODES = ("hang", "reset")
+
+
+def firmware_macros():
+    return {key: (info.sequence or "").lower() for key, info in load_macro_catalog().items()}
+
+
+class FakePico:
+    def __init__(self, name, port, latency_ms=0, jitter_ms=0, drop_rate=0, accept_delay_ms=0,
+                 keystroke_ms=0, reboot_seconds=3, macros=None, drop_mode="hang", drop_hang_seconds=30):
+        self.name = name
+        self.port = port
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.drop_rate = drop_rate
+        self.drop_mode = drop_mode
+        self.drop_hang_seconds = drop_hang_seconds
+        self.accept_delay_ms = accept_delay_ms
+        self.keystroke_ms = keystroke_ms
+        self.reboot_seconds = reboot_seconds
+        self.firmware_macros = dict(macros if macros is not None else firmware_macros())
+        self.macros = dict(self.firmware_macros)
+        self.slots = []  # pushed loadout: [macro key, input code] per slot
+        self.booted_at = time.monotonic()
+        self.rebooting_until = 0
+        self.http_requests = 0
+        self.last_macro_ts = None
+        self.last_server_recovery = None
+        # The firmware types one macro at a time
+        self.typing_lock = threading.Lock()
+        self.lock = threading.Lock()
+
+    def uptime(self):
+        return time.monotonic() - self.booted_at
+
+    def status(self):
+        used = min(MEMORY_TOTAL, 96 * 1024 + self.http_requests % 4096 * 8)
+        return {
+            "ip": "127.0.0.1",
+            "mac": f"28:cd:c1:00:00:{self.port % 256:02x}",
+            "version": "fake-pico",
+            "safe_mode": False,
+            "filesystem": "read-only",
+            "usb_mode": "hid",
+            "rssi": -50 - random.randint(0, 15),
+            "cpu_temp": 27 + random.random() * 5,
+            "uptime": round(self.uptime(), 1),
+            "http_requests": self.http_requests,
+            "last_macro_ts": self.last_macro_ts,
+            "last_server_recovery": self.last_server_recovery,
+            "memory": {"used": used, "free": MEMORY_TOTAL - used, "percent_used": used / MEMORY_TOTAL * 100},
+            "macros": self.macros,
+        }
+
+    def reboot(self):
+        with self.lock:
+            self.rebooting_until = time.monotonic() + self.reboot_seconds
+            self.booted_at = self.rebooting_until
+            self.http_requests = 0
+            self.last_macro_ts = None
+            # The pushed loadout lives in RAM only
+            self.macros = dict(self.firmware_macros)
+            self.slots = []
+
+    def load(self, size, slots):
+        with self.lock:
+            self.slots = (self.slots + [None] * size)[:size]
+            for index, (key, code) in slots.items():
+                self.slots[int(index)] = [key, code]
+                self.macros[key] = code.lower()
+
+    def serve(self, host="127.0.0.1"):
+        server = FakePicoServer((host, self.port), FakePicoHandler)
+        server.device = self
+        thread = threading.Thread(target=server.serve_forever, name=f"fake-pico-{self.name}", daemon=True)
+        thread.start()
+        return server
+
+
+class FakePicoServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 16
+
+    def get_request(self):
+        # Slow accept: the Pico's server loop picks up new connections late
+        if self.device.accept_delay_ms:
+            time.sleep(self.device.accept_delay_ms / 1000)
+        return super().get_request()
+
+
+class FakePicoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type="text/plain"):
+        data = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def begin(self):
+        # Returns False when the request is dropped
+        device = self.server.device
+        if time.monotonic() < device.rebooting_until or random.random() < device.drop_rate:
+            if device.drop_mode == "hang":
+                time.sleep(device.drop_hang_seconds)  # no answer: the client's read timeout fires first
+            self.close_connection = True  # dropped: no response at all
+            return False
+        delay = device.latency_ms + random.uniform(-device.jitter_ms, device.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        with device.lock:
+            device.http_requests += 1
+        return True
+
+    def do_POST(self):
+        device = self.server.device
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.begin():
+            return
+        if self.path.split('?', 1)[0].strip('/') != "system/loadout":
+            return self.send_body(404, "Not found")
+        try:
+            data = json.loads(body)
+            device.load(int(data["size"]), data["slots"])
+        except (ValueError, KeyError, TypeError, IndexError):
+            return self.send_body(400, "Bad loadout")
+        self.send_body(200, "OK")
+
+    def do_GET(self):
+        device = self.server.device
+        if not self.begin():
+            return
+        path = self.path.split('?', 1)[0].strip('/')
+
+        if path == "system/status.json":
+            return self.send_body(200, json.dumps(device.status()), "application/json")
+        if path == "system/reboot":
+            self.send_body(200, "Rebooting")
+            device.reboot()
+            return
+
+        if path.startswith("slot/"):
+            index = path[len("slot/"):]
+            slot = device.slots[int(index)] if index.isdigit() and int(index) < len(device.slots) else None
+            macro = slot[0] if slot else None
+        else:
+            macro = next((key for key in device.macros if key.lower() == path.lower()), None)
+        if macro is None:
+            return self.send_body(404, "Unknown macro")
+        with device.typing_lock:
+            if device.keystroke_ms:
+                time.sleep(len(device.macros[macro] or "wasd") * device.keystroke_ms / 1000)
+            device.last_macro_ts = round(device.uptime(), 1)
+        self.send_body(200, "OK")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001, help="port of the first device")
+    parser.add_argument("--count", type=int, default=2, help="number of devices on consecutive ports")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--drop-rate", type=float, default=0, help="fraction of requests answered with nothing")
+    parser.add_argument("--drop-mode", choices=DROP_MODES, default="hang",
+                        help="hang: hold a dropped request unanswered; reset: close its connection at once")
+    parser.add_argument("--drop-hang-seconds", type=float, default=30, help="how long a dropped request hangs")
+    parser.add_argument("--accept-delay-ms", type=float, default=0, help="delay before each new connection is accepted")
+    parser.add_argument("--keystroke-ms", type=float, default=0, help="typing time per keystroke of a macro")
+    parser.add_argument("--reboot-seconds", type=float, default=3)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    macros = firmware_macros()
+    devices = []
+    for i in range(args.count):
+        name = DEVICE_NAMES[i] if i < len(DEVICE_NAMES) else f"pico{i + 1}"
+        device = FakePico(name, args.port + i, args.latency_ms, args.jitter_ms, args.drop_rate,
+                          args.accept_delay_ms, args.keystroke_ms, args.reboot_seconds, macros,
+                          args.drop_mode, args.drop_hang_seconds)
+        device.serve(args.host)
+        devices.append(device)
+
+    print("MACROLINK_DEVICES=" + ",".join(f"{d.name}=http://{args.host}:{d.port}" for d in devices))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
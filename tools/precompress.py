@@ -0,0 +1,44 @@
+"""Write .gz (and .br, if the brotli module is installed) siblings for text assets in dist/.
+
+Run after `npm run build`; app.py serves the variants to clients that accept them.
+
+Usage:
+    python tools/precompress.py [dist]
+"""
+import gzip, os, sys
+
+try:
+    import brotli # type: ignore
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.html', '.js', '.css', '.json', '.svg', '.txt', '.map', '.wav')
+MIN_SIZE = 1024
+
+
+def precompress(root):
+    written = 0
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if not filename.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(dirpath, filename)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < MIN_SIZE:
+                continue
+            variants = [('.gz', gzip.compress(data, compresslevel=9))]
+            if brotli is not None:
+                variants.append(('.br', brotli.compress(data)))
+            for suffix, compressed in variants:
+                # Only keep variants that actually save bytes
+                if len(compressed) < len(data):
+                    with open(path + suffix, 'wb') as f:
+                        f.write(compressed)
+                    written += 1
+    return written
+
+
+if __name__ == '__main__':
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), '..', 'dist')
+    print(f"Wrote {precompress(root)} precompressed files under {root}")
@@ -4,10 +4,26 @@ import { defineConfig } from 'vite'
 import vue from '@vitejs/plugin-vue'
 import vueDevTools from 'vite-plugin-vue-devtools'
 import tailwindcss from '@tailwindcss/vite'
+import * as macroData from './src/data/macroData.js'
+
+// The backend's macro catalog: the objects of macroData.js as JSON in dist/,
+// so the server never has to read the frontend sources at runtime
+const MACRO_DATA_OBJECTS = ['STATIC_MACROS', 'DYNAMIC_MACROS', 'MACRO_IMAGES', 'MACRO_STYLES', 'MACRO_SEQUENCES']
+
+function macroCatalog() {
+  return {
+    name: 'macro-catalog',
+    apply: 'build',
+    generateBundle() {
+      const objects = Object.fromEntries(MACRO_DATA_OBJECTS.map((name) => [name, macroData[name]]))
+      this.emitFile({ type: 'asset', fileName: 'macro-data.json', source: JSON.stringify(objects, null, 2) })
+    },
+  }
+}
 
 // https://vite.dev/config/
 export default defineConfig({
-  plugins: [vue(), tailwindcss()],
+  plugins: [vue(), tailwindcss(), macroCatalog()],
   server: {
     port: 3000,
     host: true,